@@ -1,3 +1,5 @@
+-- Baseline schema only. Later changes are applied with `python manage.py migrate_event_log`
+-- (see src/core/event_log_schema.py).
 CREATE TABLE IF NOT EXISTS event_log
 (
     `event_type` String,
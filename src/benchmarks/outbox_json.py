@@ -0,0 +1,61 @@
+"""
+Compares the stdlib `json` module, used by Django's `JSONField`, with
+`core.json_codec` on outbox payloads from 1 KB to 5 MB.
+
+    python -m benchmarks.outbox_json
+"""
+import datetime as dt
+import json
+import sys
+import timeit
+import uuid
+from collections.abc import Callable
+from typing import Any
+
+from core import json_codec
+
+PAYLOAD_SIZES = (1024, 64 * 1024, 1024 * 1024, 5 * 1024 * 1024)
+
+
+def build_payload(size: int) -> dict[str, Any]:
+    """Builds an event context of about `size` bytes of JSON."""
+    record = {
+        'id': str(uuid.uuid4()),
+        'email': 'user@example.com',
+        'first_name': 'First',
+        'last_name': 'Last',
+        'created_at': dt.datetime.now(dt.UTC).isoformat(),
+        'score': 12.5,
+        'active': True,
+        'tags': ['a', 'b', 'c'],
+    }
+    record_size = len(json.dumps(record))
+    return {'records': [record] * max(size // record_size, 1)}
+
+
+def measure(function: Callable[[], Any]) -> float:
+    """Returns the best time of a single call in milliseconds."""
+    number, _ = timeit.Timer(function).autorange()
+    best = min(timeit.repeat(function, number=number, repeat=5))
+    return best / number * 1000
+
+
+def main() -> None:
+    sys.stdout.write(f'{"size":>10} {"op":>7} {"json ms":>10} {"codec ms":>10} {"speedup":>8}\n')
+    for size in PAYLOAD_SIZES:
+        payload = build_payload(size)
+        encoded = json.dumps(payload)
+        timings = {
+            'encode': (lambda: json.dumps(payload), lambda: json_codec.dumps(payload)),  # noqa: B023
+            'decode': (lambda: json.loads(encoded), lambda: json_codec.loads(encoded)),  # noqa: B023
+        }
+        for operation, (stdlib, codec) in timings.items():
+            stdlib_ms, codec_ms = measure(stdlib), measure(codec)
+            sys.stdout.write(
+                f'{len(encoded):>10} {operation:>7} {stdlib_ms:>10.3f} {codec_ms:>10.3f} '
+                f'{stdlib_ms / codec_ms:>7.1f}x\n',
+            )
+
+
+if __name__ == '__main__':
+    main()
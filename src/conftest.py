@@ -5,12 +5,20 @@ import clickhouse_connect
 import pytest
 from clickhouse_connect.driver import Client
 
+from core.event_log_schema import EventLogSchema
 from users.models import EventType
 from users.use_cases.create_user import CreateUserRequest
 
 
+@pytest.fixture(scope="session")
+def f_event_log_schema() -> None:
+    client = clickhouse_connect.get_client(host="clickhouse")
+    EventLogSchema(client).migrate()
+    client.close()
+
+
 @pytest.fixture(scope="module")
-def f_ch_client() -> Client:
+def f_ch_client(f_event_log_schema: None) -> Client:  # noqa: ARG001
     client = clickhouse_connect.get_client(host="clickhouse")
     yield client
     client.close()
@@ -2,8 +2,14 @@ from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
 from celery.schedules import timedelta
+from celery.signals import task_failure, worker_process_init, worker_process_shutdown
+from celery.worker.control import control_command
 from django.conf import settings
 
+from core.db import close_db_connections_after_failure, reset_db_connections_after_fork
+from core.process_pool import shutdown_process_pool
+from core.profiling import get_batch_profiler
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'src.core.settings')
 
 app = Celery('src')
@@ -11,10 +17,23 @@ app = Celery('src')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 
+worker_process_init.connect(reset_db_connections_after_fork)
+task_failure.connect(close_db_connections_after_failure)
+worker_process_shutdown.connect(shutdown_process_pool)
+
+
+@control_command(args=[('batches', int)], signature='[N=1]')
+def profile_outbox(state: object, batches: int = 1) -> dict[str, str]:  # noqa: ARG001
+    """Profiles the next N outbox batches, see core.profiling."""
+    get_batch_profiler().request(batches)
+    return {'ok': f'profiling the next {batches} outbox batches'}
+
 
+# drain_event_outbox reschedules itself, beat only restarts drain chains that died
 app.conf.beat_schedule = {
-    'my-periodic-task': {
-        'task': 'users.tasks.process_event_outbox',
-        'schedule': timedelta(seconds=5),  # runs every 5 seconds
+    'drain-event-outbox': {
+        'task': 'users.tasks.drain_event_outbox',
+        'schedule': timedelta(seconds=settings.OUTBOX_POLL_MAX_DELAY),
+        'options': {'expires': settings.OUTBOX_POLL_MAX_DELAY},
     },
 }
@@ -0,0 +1,85 @@
+import time
+from enum import StrEnum
+
+import redis
+import structlog
+
+from core.redis import fail_open, get_redis
+
+logger = structlog.get_logger(__name__)
+
+# Share of the full throughput allowed right after the breaker closes
+RAMP_FLOOR = 0.1
+
+
+class CircuitState(StrEnum):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker whose state is shared by all processes through Redis.
+
+    It opens after `failure_threshold` consecutive failures and lets a single
+    trial request through once `reset_timeout` seconds have passed. After it
+    closes, `ramp_fraction()` rises from `RAMP_FLOOR` to 1 over `ramp_seconds`
+    so callers can scale their throughput back up gradually.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        reset_timeout: float,
+        ramp_seconds: float,
+        client: redis.Redis | None = None,
+    ) -> None:
+        self._name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._ramp_seconds = ramp_seconds
+        self._client = client or get_redis()
+
+    @fail_open(CircuitState.CLOSED)
+    def state(self) -> CircuitState:
+        opened_at = self._client.get(self._key('opened_at'))
+        if opened_at is None:
+            return CircuitState.CLOSED
+        if time.time() - float(opened_at) < self._reset_timeout:
+            return CircuitState.OPEN
+        return CircuitState.HALF_OPEN
+
+    @fail_open(True)
+    def allow_request(self) -> bool:
+        state = self.state()
+        if state == CircuitState.HALF_OPEN:
+            # Only one caller across the cluster gets to probe the server
+            return bool(self._client.set(self._key('trial'), 1, nx=True, ex=max(int(self._reset_timeout), 1)))
+        return state == CircuitState.CLOSED
+
+    @fail_open(None)
+    def record_success(self) -> None:
+        if self._client.delete(self._key('opened_at')):
+            logger.info('circuit breaker closed', name=self._name)
+            self._client.set(self._key('closed_at'), time.time(), ex=max(int(self._ramp_seconds), 1))
+        self._client.delete(self._key('failures'), self._key('trial'))
+
+    @fail_open(None)
+    def record_failure(self) -> None:
+        failures = self._client.incr(self._key('failures'))
+        if failures >= self._failure_threshold or self.state() == CircuitState.HALF_OPEN:
+            logger.warning('circuit breaker opened', name=self._name, failures=failures)
+            self._client.set(self._key('opened_at'), time.time())
+            self._client.delete(self._key('trial'), self._key('closed_at'))
+
+    @fail_open(1.0)
+    def ramp_fraction(self) -> float:
+        closed_at = self._client.get(self._key('closed_at'))
+        if closed_at is None or self._ramp_seconds <= 0:
+            return 1.0
+        return min(max((time.time() - float(closed_at)) / self._ramp_seconds, RAMP_FLOOR), 1.0)
+
+    def _key(self, suffix: str) -> str:
+        return f'{self._name}:{suffix}'
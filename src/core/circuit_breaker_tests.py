@@ -0,0 +1,89 @@
+import uuid
+from unittest.mock import patch
+
+import pytest
+
+from core.circuit_breaker import RAMP_FLOOR, CircuitBreaker, CircuitState
+from core.rate_limiter import TokenBucket
+
+
+def make_breaker(reset_timeout: float = 30) -> CircuitBreaker:
+    return CircuitBreaker(
+        f'test:{uuid.uuid4()}',
+        failure_threshold=2,
+        reset_timeout=reset_timeout,
+        ramp_seconds=60,
+    )
+
+
+def test_breaker_opens_after_consecutive_failures() -> None:
+    breaker = make_breaker()
+
+    breaker.record_failure()
+    assert breaker.state() == CircuitState.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state() == CircuitState.OPEN
+    assert not breaker.allow_request()
+
+
+def test_success_resets_failures() -> None:
+    breaker = make_breaker()
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state() == CircuitState.CLOSED
+
+
+def test_half_open_breaker_allows_single_trial() -> None:
+    breaker = make_breaker(reset_timeout=0)
+    breaker.record_failure()
+    breaker.record_failure()
+
+    assert breaker.state() == CircuitState.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+def test_closed_breaker_ramps_up() -> None:
+    breaker = make_breaker(reset_timeout=0)
+    assert breaker.ramp_fraction() == 1.0
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+
+    assert breaker.state() == CircuitState.CLOSED
+    assert breaker.ramp_fraction() == RAMP_FLOOR
+
+
+def test_token_bucket_waits_for_refill() -> None:
+    bucket = TokenBucket(f'test:{uuid.uuid4()}', rate=100)
+
+    with patch('core.rate_limiter.time.sleep') as mock_sleep:
+        bucket.acquire(100)
+        mock_sleep.assert_not_called()
+
+        with patch.object(bucket, '_try_acquire', side_effect=[0.5, 0]):
+            bucket.acquire(50)
+        mock_sleep.assert_called_once_with(0.5)
+
+
+def test_token_bucket_refuses_over_budget() -> None:
+    bucket = TokenBucket(f'test:{uuid.uuid4()}', rate=100)
+
+    assert bucket._try_acquire(100, rate=100) == 0
+    assert bucket._try_acquire(50, rate=100) > 0
+
+
+def test_token_bucket_throttles_requests_larger_than_its_rate() -> None:
+    bucket = TokenBucket(f'test:{uuid.uuid4()}', rate=100)
+
+    with patch('core.rate_limiter.time.sleep') as mock_sleep:
+        bucket.acquire(1000)
+        # Nine seconds of debt on top of the one second of tokens in the bucket
+        assert mock_sleep.call_args.args[0] == pytest.approx(9, abs=0.1)
+        bucket.acquire(100)
+        assert mock_sleep.call_args.args[0] == pytest.approx(10, abs=0.1)
@@ -0,0 +1,26 @@
+from typing import Any
+
+from django.db import connections
+
+
+def reset_db_connections_after_fork(**kwargs: Any) -> None:  # noqa: ANN401, ARG001
+    """
+    Drops connection pools inherited from the parent process, so that every
+    worker process opens its own. They are not closed because their sockets
+    still belong to the parent. Django 5.1 has no API to drop a pool without
+    closing it, so this relies on the PostgreSQL backend's `_connection_pools`
+    class attribute, which core/db_tests.py checks on every upgrade.
+    """
+    for connection in connections.all():
+        getattr(connection, '_connection_pools', {}).pop(connection.alias, None)
+
+
+def close_db_connections_after_failure(**kwargs: Any) -> None:  # noqa: ANN401, ARG001
+    """
+    Returns connections left over by a failed task to the pool (or closes
+    them), so the next task doesn't inherit a broken transaction. Connections
+    inside an atomic block are left to it, e.g. for eager tasks.
+    """
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close()
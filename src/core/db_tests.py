@@ -0,0 +1,44 @@
+import os
+from collections.abc import Generator
+
+import pytest
+from django.db import connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+from core.db import reset_db_connections_after_fork
+
+
+@pytest.fixture
+def f_pooled_connection() -> Generator:
+    connection = connections['default']
+    settings_dict = {**connection.settings_dict, 'CONN_MAX_AGE': 0, 'OPTIONS': {'pool': {'min_size': 1}}}
+    pooled = connection.__class__(settings_dict, alias=connection.alias)
+    connections[connection.alias] = pooled
+    yield pooled
+    pooled.close()
+    pooled.close_pool()
+    connections[connection.alias] = connection
+
+
+@pytest.mark.django_db
+def test_forked_process_opens_its_own_pool(f_pooled_connection: BaseDatabaseWrapper) -> None:
+    f_pooled_connection.ensure_connection()
+    parent_pool = f_pooled_connection.pool
+    f_pooled_connection.close()
+
+    pid = os.fork()
+    if pid == 0:
+        # Never return into pytest from the child
+        try:
+            reset_db_connections_after_fork()
+            connection = connections['default']
+            connection.ensure_connection()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            os._exit(0 if connection.pool is not parent_pool else 1)
+        except BaseException:
+            os._exit(2)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert f_pooled_connection.pool is parent_pool
@@ -1,16 +1,22 @@
+import datetime as dt
 import re
-from collections.abc import Generator, Sequence
+from collections.abc import Generator, Mapping, Sequence
 from contextlib import contextmanager
+from functools import cache
 from typing import Any
 
 import clickhouse_connect
 import structlog
-from clickhouse_connect.driver.exceptions import DatabaseError
+from clickhouse_connect.driver.exceptions import DatabaseError, StreamFailureError
 from django.conf import settings
 from django.utils import timezone
-from sentry_sdk import start_transaction
 
 from core.base_model import Model
+from core.circuit_breaker import CircuitBreaker
+from core.event_log_rollups import Granularity, build_aggregate_query
+from core.query_cache import MISSING, QueryCache
+from core.rate_limiter import TokenBucket
+from core.tracing import trace_stage
 
 logger = structlog.get_logger(__name__)
 
@@ -19,72 +25,229 @@ EVENT_LOG_COLUMNS = [
     'event_date_time',
     'environment',
     'event_context',
+    'metadata_version',
 ]
 
 
+def event_context_bytes(columns: list[list[Any]]) -> int:
+    """UTF-8 encoded size of the `event_context` column built by `EventLogClient.to_columns`."""
+    return sum(len(context.encode()) for context in columns[EVENT_LOG_COLUMNS.index('event_context')])
+
+
+class EventLogRecord(Model):
+    event: Model
+    metadata_version: int = 1
+    # When the event happened, e.g. its outbox row's time; defaults to the insert time
+    event_date_time: dt.datetime | None = None
+
+
+class QueryResult(Model):
+    column_names: tuple[str, ...] = ()
+    rows: list[tuple[Any, ...]] = []
+
+
+class EventLogQueryError(Exception):
+    pass
+
+
+class EventLogUnavailableError(Exception):
+    pass
+
+
+@cache
+def get_query_cache() -> QueryCache:
+    return QueryCache(
+        maxsize=settings.CLICKHOUSE_QUERY_CACHE_SIZE,
+        ttl=settings.CLICKHOUSE_QUERY_CACHE_TTL,
+    )
+
+
+@cache
+def get_circuit_breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        'clickhouse:circuit_breaker',
+        failure_threshold=settings.CLICKHOUSE_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=settings.CLICKHOUSE_BREAKER_RESET_TIMEOUT,
+        ramp_seconds=settings.CLICKHOUSE_BREAKER_RAMP_SECONDS,
+    )
+
+
+@cache
+def get_insert_rate_limiters() -> tuple[TokenBucket, TokenBucket]:
+    return (
+        TokenBucket('clickhouse:insert_rows', settings.CLICKHOUSE_INSERT_ROWS_PER_SECOND),
+        TokenBucket('clickhouse:insert_bytes', settings.CLICKHOUSE_INSERT_BYTES_PER_SECOND),
+    )
+
+
 class EventLogClient:
     def __init__(self, client: clickhouse_connect.driver.Client) -> None:
         self._client = client
 
     @classmethod
-    @contextmanager
-    def init(cls) -> Generator['EventLogClient']:
-        client = clickhouse_connect.get_client(
+    def connect(cls) -> clickhouse_connect.driver.Client:
+        return clickhouse_connect.get_client(
             host=settings.CLICKHOUSE_HOST,
             port=settings.CLICKHOUSE_PORT,
             user=settings.CLICKHOUSE_USER,
             password=settings.CLICKHOUSE_PASSWORD,
             query_retries=2,
-            connect_timeout=30,
+            connect_timeout=settings.CLICKHOUSE_CONNECT_TIMEOUT,
             send_receive_timeout=10,
         )
+
+    @classmethod
+    @contextmanager
+    def init(cls) -> Generator['EventLogClient']:
+        try:
+            client = cls.connect()
+        except DatabaseError:
+            get_circuit_breaker().record_failure()
+            raise
         try:
             yield cls(client)
         except Exception as e:
             logger.error('error while executing clickhouse query', error=str(e))
+            raise
         finally:
             client.close()
 
     def insert(
         self,
-        data: Sequence[Model],
+        data: Sequence[Model | EventLogRecord],
         chunk_size: int = 1000,
     ) -> None:
-        with start_transaction(op="task", name="Insert into Clickhouse"):
-            try:
-                for i in range(0, len(data), chunk_size):
-                    chunk = data[i:i + chunk_size]
-                    self._client.insert(
-                        data=self._convert_data(chunk),
-                        column_names=EVENT_LOG_COLUMNS,
-                        database=settings.CLICKHOUSE_SCHEMA,
-                        table=settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME,
-                    )
-            except DatabaseError as e:
-                logger.error('unable to insert data to clickhouse', error=str(e))
-
-
-    def query(self, query: str) -> Any:  # noqa: ANN401
-        logger.debug('executing clickhouse query', query=query)
+        """
+        Inserts `data` in chunks, throttled by the shared rows/s and bytes/s
+        limits. Raises `EventLogUnavailableError` while the circuit breaker
+        is open and re-raises insert errors, so callers don't acknowledge
+        events that were not written.
+        """
+        self.insert_columns(self.to_columns(data), chunk_size=chunk_size)
+
+    def insert_columns(
+        self,
+        columns: list[list[Any]],
+        chunk_size: int = 1000,
+    ) -> None:
+        """Inserts columns built by `to_columns`, see `insert`."""
+        for i in range(0, len(columns[0]), chunk_size):
+            chunk = [column[i:i + chunk_size] for column in columns]
+            rows, size = len(chunk[0]), event_context_bytes(chunk)
+            # Checked before waiting for the limits, and only one caller probes a half-open breaker
+            if not get_circuit_breaker().allow_request():
+                raise EventLogUnavailableError('clickhouse circuit breaker is open')
+            with trace_stage('clickhouse.throttle', 'Wait for Clickhouse insert limits', rows=rows, bytes=size):
+                self._throttle(rows, size)
+            with trace_stage('clickhouse.insert', 'Insert into Clickhouse', rows=rows, bytes=size):
+                self._insert_chunk(chunk)
+
+    def query(
+        self,
+        query: str,
+        parameters: Mapping[str, Any] | None = None,
+        use_cache: bool = False,
+    ) -> QueryResult:
+        """Runs `query` with server-side `parameters`. Raises `EventLogQueryError` if it fails."""
+        logger.debug('executing clickhouse query', query=query, parameters=parameters)
+
+        cache_key = QueryCache.make_key(query, parameters)
+        if use_cache and (cached := get_query_cache().get(cache_key)) is not MISSING:
+            return cached
 
         try:
-            return self._client.query(query).result_rows
+            result = self._client.query(query, parameters=parameters)
         except DatabaseError as e:
             logger.error('failed to execute clickhouse query', error=str(e))
-            return
+            raise EventLogQueryError(str(e)) from e
+
+        query_result = QueryResult(column_names=result.column_names, rows=result.result_rows)
+        if use_cache:
+            get_query_cache().set(cache_key, query_result)
+        return query_result
+
+    def aggregate(
+        self,
+        start: dt.datetime | None = None,
+        end: dt.datetime | None = None,
+        bucket: Granularity | None = None,
+        event_types: list[str] | None = None,
+        environment: str | None = None,
+        use_cache: bool = True,
+    ) -> QueryResult:
+        """
+        Counts events and distinct emails per event type and environment,
+        reading from the coarsest rollup that can answer the query exactly.
+        """
+        query, parameters = build_aggregate_query(
+            start=start,
+            end=end,
+            bucket=bucket,
+            event_types=event_types,
+            environment=environment,
+        )
+        return self.query(query, parameters=parameters, use_cache=use_cache)
+
+    def stream(
+        self,
+        query: str,
+        parameters: Mapping[str, Any] | None = None,
+    ) -> Generator[Sequence[Sequence[Any]]]:
+        """
+        Yields result rows in blocks as ClickHouse sends them, so large
+        exports don't have to fit in memory.
+        """
+        logger.debug('streaming clickhouse query', query=query, parameters=parameters)
 
-    def _convert_data(self, data: list[Model]) -> list[tuple[Any]]:
+        try:
+            with self._client.query_row_block_stream(query, parameters=parameters) as blocks:
+                yield from blocks
+        except (DatabaseError, StreamFailureError) as e:
+            # StreamFailureError is raised when the server fails mid-stream
+            logger.error('failed to stream clickhouse query', error=str(e))
+            raise EventLogQueryError(str(e)) from e
+
+    @classmethod
+    def to_columns(cls, data: Sequence[Model | EventLogRecord]) -> list[list[Any]]:
+        """
+        Serializes `data` into ready-to-insert `EVENT_LOG_COLUMNS`. Needs no
+        connection, so it can run in other processes.
+        """
+        records = [
+            record if isinstance(record, EventLogRecord) else EventLogRecord(event=record)
+            for record in data
+        ]
         return [
-            (
-                self._to_snake_case(event.__class__.__name__),
-                timezone.now(),
-                settings.ENVIRONMENT,
-                event.model_dump_json(),
-            )
-            for event in data
+            [cls._to_snake_case(record.event.__class__.__name__) for record in records],
+            [record.event_date_time or timezone.now() for record in records],
+            [settings.ENVIRONMENT] * len(records),
+            [record.event.model_dump_json() for record in records],
+            [record.metadata_version for record in records],
         ]
 
-    def _to_snake_case(self, event_name: str) -> str:
+    def _throttle(self, rows: int, size: int) -> None:
+        ramp_fraction = get_circuit_breaker().ramp_fraction()
+        rows_limiter, bytes_limiter = get_insert_rate_limiters()
+        rows_limiter.acquire(rows, ramp_fraction)
+        bytes_limiter.acquire(size, ramp_fraction)
+
+    def _insert_chunk(self, columns: list[list[Any]]) -> None:
+        circuit_breaker = get_circuit_breaker()
+        try:
+            self._client.insert(
+                data=columns,
+                column_names=EVENT_LOG_COLUMNS,
+                column_oriented=True,
+                database=settings.CLICKHOUSE_SCHEMA,
+                table=settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME,
+            )
+        except DatabaseError as e:
+            logger.error('unable to insert data to clickhouse', error=str(e))
+            circuit_breaker.record_failure()
+            raise
+        circuit_breaker.record_success()
+
+    @staticmethod
+    def _to_snake_case(event_name: str) -> str:
         result = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', event_name)
         return re.sub('([a-z0-9])([A-Z])', r'\1_\2', result).lower()
-
@@ -0,0 +1,130 @@
+import datetime as dt
+import uuid
+from collections.abc import Generator
+from unittest.mock import MagicMock, patch
+
+import pytest
+from clickhouse_connect.driver import Client
+from clickhouse_connect.driver.exceptions import StreamFailureError
+from django.conf import settings
+
+from core.circuit_breaker import CircuitBreaker
+from core.event_log_client import EventLogClient, EventLogQueryError, EventLogUnavailableError, get_query_cache
+from core.event_log_rollups import Granularity, rollup_table_name
+from users.use_cases import UserCreated
+
+
+@pytest.fixture(autouse=True)
+def f_event_log(f_ch_client: Client) -> Generator:
+    f_ch_client.query(f'TRUNCATE TABLE {settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME}')
+    with EventLogClient.init() as client:
+        client.insert([
+            UserCreated(email=f'user_{i}@email.com', first_name='Test', last_name='Testovich')
+            for i in range(3)
+        ])
+    get_query_cache().clear()
+    yield
+
+
+def test_query_binds_parameters() -> None:
+    with EventLogClient.init() as client:
+        result = client.query(
+            f'SELECT email FROM {settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME} WHERE email = {{email:String}}',  # noqa: S608
+            parameters={'email': 'user_1@email.com'},
+        )
+
+    assert result.column_names == ('email',)
+    assert result.rows == [('user_1@email.com',)]
+
+
+def test_query_raises_query_error() -> None:
+    with pytest.raises(EventLogQueryError), EventLogClient.init() as client:
+        client.query('SELECT * FROM table_that_does_not_exist')
+
+
+def test_query_result_is_cached(f_ch_client: Client) -> None:
+    query = f'SELECT count() FROM {settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME}'  # noqa: S608
+
+    with EventLogClient.init() as client:
+        first = client.query(query, use_cache=True)
+        f_ch_client.query(f'TRUNCATE TABLE {settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME}')
+        second = client.query(query, use_cache=True)
+        uncached = client.query(query)
+
+    assert first.rows == second.rows == [(3,)]
+    assert uncached.rows == [(0,)]
+
+
+def test_stream_yields_all_rows() -> None:
+    with EventLogClient.init() as client:
+        blocks = list(client.stream(
+            f'SELECT email FROM {settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME} ORDER BY email',  # noqa: S608
+        ))
+
+    assert [row[0] for block in blocks for row in block] == [f'user_{i}@email.com' for i in range(3)]
+
+
+def test_stream_raises_query_error() -> None:
+    with pytest.raises(EventLogQueryError), EventLogClient.init() as client:
+        list(client.stream('SELECT * FROM table_that_does_not_exist'))
+
+
+def test_stream_failure_raises_query_error() -> None:
+    def fail_mid_stream() -> Generator:
+        yield [(1,)]
+        raise StreamFailureError('Code: 241. Memory limit exceeded')
+
+    clickhouse = MagicMock()
+    clickhouse.query_row_block_stream.return_value.__enter__.return_value = fail_mid_stream()
+
+    with pytest.raises(EventLogQueryError):
+        list(EventLogClient(clickhouse).stream('SELECT 1'))
+
+
+def test_open_breaker_fails_insert_before_throttling() -> None:
+    breaker = CircuitBreaker(f'test:{uuid.uuid4()}', failure_threshold=1, reset_timeout=30, ramp_seconds=0)
+    breaker.record_failure()
+    record = UserCreated(email='user@email.com', first_name='Test', last_name='Testovich')
+    clickhouse = MagicMock()
+
+    with patch('core.event_log_client.get_circuit_breaker', return_value=breaker), patch.object(
+        EventLogClient, '_throttle',
+    ) as throttle, pytest.raises(EventLogUnavailableError):
+        EventLogClient(clickhouse).insert([record])
+
+    throttle.assert_not_called()
+    clickhouse.insert.assert_not_called()
+
+
+def test_half_open_breaker_refuses_inserts_while_another_caller_probes() -> None:
+    breaker = CircuitBreaker(f'test:{uuid.uuid4()}', failure_threshold=1, reset_timeout=0, ramp_seconds=0)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    record = UserCreated(email='user@email.com', first_name='Test', last_name='Testovich')
+    clickhouse = MagicMock()
+
+    with patch('core.event_log_client.get_circuit_breaker', return_value=breaker), pytest.raises(
+        EventLogUnavailableError,
+    ):
+        EventLogClient(clickhouse).insert([record])
+
+    clickhouse.insert.assert_not_called()
+
+
+def test_aggregate_matches_event_log(f_ch_client: Client) -> None:
+    f_ch_client.command(f'TRUNCATE TABLE {settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME}')
+    for granularity in Granularity:
+        f_ch_client.command(f'TRUNCATE TABLE {rollup_table_name(granularity)}')
+    with EventLogClient.init() as client:
+        client.insert([
+            UserCreated(email=f'user_{i % 2}@email.com', first_name='Test', last_name='Testovich')
+            for i in range(4)
+        ])
+        from_rollup = client.aggregate(event_types=['user_created'], use_cache=False)
+        from_event_log = client.aggregate(
+            start=dt.datetime(2000, 1, 1, 0, 0, 1, tzinfo=dt.UTC),
+            event_types=['user_created'],
+            use_cache=False,
+        )
+
+    assert from_rollup.rows == from_event_log.rows == [('user_created', 'Local', 4, 2)]
@@ -0,0 +1,111 @@
+import datetime as dt
+from enum import StrEnum
+from typing import Any
+
+from django.conf import settings
+
+
+class Granularity(StrEnum):
+    MINUTE = 'minute'
+    HOUR = 'hour'
+    DAY = 'day'
+
+
+GRANULARITY_SECONDS = {
+    Granularity.MINUTE: 60,
+    Granularity.HOUR: 60 * 60,
+    Granularity.DAY: 24 * 60 * 60,
+}
+
+BUCKET_FUNCTIONS = {
+    Granularity.MINUTE: 'toStartOfMinute',
+    Granularity.HOUR: 'toStartOfHour',
+    Granularity.DAY: 'toStartOfDay',
+}
+
+
+def rollup_table_name(granularity: Granularity) -> str:
+    return f'{settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME}_{granularity}'
+
+
+def choose_rollup(
+    start: dt.datetime | None,
+    end: dt.datetime | None,
+    bucket: Granularity | None,
+) -> Granularity | None:
+    """
+    Returns the coarsest rollup that answers the query exactly: its buckets
+    must not be wider than the requested one and the time range must be
+    aligned to them. Returns None when only the raw event log can answer it.
+    """
+    for granularity in sorted(GRANULARITY_SECONDS, key=GRANULARITY_SECONDS.get, reverse=True):
+        seconds = GRANULARITY_SECONDS[granularity]
+        if bucket is not None and GRANULARITY_SECONDS[bucket] < seconds:
+            continue
+        if all(bound is None or bound.timestamp() % seconds == 0 for bound in (start, end)):
+            return granularity
+    return None
+
+
+def build_aggregate_query(
+    start: dt.datetime | None = None,
+    end: dt.datetime | None = None,
+    bucket: Granularity | None = None,
+    event_types: list[str] | None = None,
+    environment: str | None = None,
+) -> tuple[str, dict[str, Any]]:
+    """
+    Builds a query counting events and distinct emails per event type and
+    environment, optionally per time bucket, over [start, end).
+    Datetimes must be timezone-aware, and rollup buckets are aligned in the
+    ClickHouse server timezone, which is expected to be UTC.
+    """
+    granularity = choose_rollup(start, end, bucket)
+    database = settings.CLICKHOUSE_SCHEMA
+    if granularity is None:
+        source = f'{database}.{settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME}'
+        time_column, aggregates = 'event_date_time', ('count()', 'uniq(email)')
+    else:
+        source = f'{database}.{rollup_table_name(granularity)}'
+        time_column, aggregates = 'bucket', ('sum(events)', 'uniqMerge(unique_emails)')
+
+    conditions, parameters = _build_conditions(time_column, start, end, event_types, environment)
+    columns, group_by = _build_columns(time_column, bucket, *aggregates)
+
+    query = f'SELECT {", ".join(columns)} FROM {source}'  # noqa: S608
+    if conditions:
+        query += f' WHERE {" AND ".join(conditions)}'
+    query += f' GROUP BY {", ".join(group_by)} ORDER BY {", ".join(group_by)}'
+    return query, parameters
+
+
+def _build_conditions(
+    time_column: str,
+    start: dt.datetime | None,
+    end: dt.datetime | None,
+    event_types: list[str] | None,
+    environment: str | None,
+) -> tuple[list[str], dict[str, Any]]:
+    # clickhouse-connect binds datetimes under `_64` suffixed keys with microseconds.
+    filters = [
+        (f'{time_column} >= {{start:DateTime64(6)}}', 'start_64', start),
+        (f'{time_column} < {{end:DateTime64(6)}}', 'end_64', end),
+        ('has({event_types:Array(String)}, event_type)', 'event_types', event_types or None),
+        ('environment = {environment:String}', 'environment', environment),
+    ]
+    applied = [(condition, parameter, value) for condition, parameter, value in filters if value is not None]
+    return [condition for condition, _, _ in applied], {parameter: value for _, parameter, value in applied}
+
+
+def _build_columns(
+    time_column: str,
+    bucket: Granularity | None,
+    events: str,
+    unique_emails: str,
+) -> tuple[list[str], list[str]]:
+    group_by = ['event_type', 'environment']
+    columns = [*group_by, f'{events} AS events', f'{unique_emails} AS unique_emails']
+    if bucket is not None:
+        columns.insert(0, f'toDateTime({BUCKET_FUNCTIONS[bucket]}({time_column})) AS bucket_start')
+        group_by.insert(0, 'bucket_start')
+    return columns, group_by
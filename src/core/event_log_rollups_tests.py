@@ -0,0 +1,51 @@
+import datetime as dt
+
+import pytest
+
+from core.event_log_rollups import Granularity, build_aggregate_query, choose_rollup
+
+DAY_START = dt.datetime(2024, 11, 1, tzinfo=dt.UTC)
+
+
+@pytest.mark.parametrize(
+    ('start', 'end', 'bucket', 'expected'),
+    [
+        (DAY_START, DAY_START + dt.timedelta(days=7), None, Granularity.DAY),
+        (DAY_START, DAY_START + dt.timedelta(days=7), Granularity.HOUR, Granularity.HOUR),
+        (DAY_START, DAY_START + dt.timedelta(hours=5), None, Granularity.HOUR),
+        (DAY_START + dt.timedelta(minutes=1), DAY_START + dt.timedelta(days=1), Granularity.DAY, Granularity.MINUTE),
+        (DAY_START + dt.timedelta(seconds=1), DAY_START + dt.timedelta(days=1), None, None),
+        (None, None, None, Granularity.DAY),
+    ],
+)
+def test_coarsest_suitable_rollup_is_chosen(
+    start: dt.datetime | None,
+    end: dt.datetime | None,
+    bucket: Granularity | None,
+    expected: Granularity | None,
+) -> None:
+    assert choose_rollup(start, end, bucket) == expected
+
+
+def test_aggregate_query_reads_rollup() -> None:
+    query, parameters = build_aggregate_query(
+        start=DAY_START,
+        end=DAY_START + dt.timedelta(days=1),
+        bucket=Granularity.HOUR,
+        event_types=['user_created'],
+    )
+
+    assert 'FROM default.event_log_hour' in query
+    assert 'uniqMerge(unique_emails)' in query
+    assert parameters == {
+        'start_64': DAY_START,
+        'end_64': DAY_START + dt.timedelta(days=1),
+        'event_types': ['user_created'],
+    }
+
+
+def test_aggregate_query_falls_back_to_event_log() -> None:
+    query, _ = build_aggregate_query(start=DAY_START + dt.timedelta(seconds=30))
+
+    assert 'FROM default.event_log ' in query
+    assert 'count() AS events' in query
@@ -0,0 +1,165 @@
+import structlog
+from clickhouse_connect.driver import Client
+from django.conf import settings
+from django.utils import timezone
+
+from core.base_model import Model
+
+logger = structlog.get_logger(__name__)
+
+MIGRATIONS_TABLE_NAME = 'event_log_schema_migrations'
+
+
+class EventLogMigration(Model):
+    name: str
+    statements: list[str]
+
+
+def _rollup_statements(granularity: str, bucket_function: str) -> list[str]:
+    rollup = f'{{database}}.{{table}}_{granularity}'
+    aggregate = f"""
+        SELECT
+            toDateTime({bucket_function}(event_date_time)) AS bucket,
+            event_type,
+            environment,
+            count() AS events,
+            uniqState(email) AS unique_emails
+        FROM {{database}}.{{table}}
+        GROUP BY bucket, event_type, environment
+    """
+    return [
+        f'DROP VIEW IF EXISTS {rollup}_mv',
+        f"""
+        CREATE TABLE IF NOT EXISTS {rollup}
+        (
+            `bucket` DateTime,
+            `event_type` LowCardinality(String),
+            `environment` LowCardinality(String),
+            `events` SimpleAggregateFunction(sum, UInt64),
+            `unique_emails` AggregateFunction(uniq, String)
+        )
+        ENGINE = AggregatingMergeTree()
+        PARTITION BY toYYYYMM(bucket)
+        ORDER BY (event_type, environment, bucket)
+        """,
+        f'TRUNCATE TABLE {rollup}',
+        f'CREATE MATERIALIZED VIEW {rollup}_mv TO {rollup} AS {aggregate}',
+        f'INSERT INTO {rollup} {aggregate}',
+    ]
+
+
+# Statements are formatted with `database` and `table`. A migration must be
+# safe to re-run from the start if it failed halfway through.
+MIGRATIONS = [
+    EventLogMigration(
+        name='0001_initial',
+        statements=[
+            """
+            CREATE TABLE IF NOT EXISTS {database}.{table}
+            (
+                `event_type` String,
+                `event_date_time` DateTime64(6),
+                `environment` String,
+                `event_context` String,
+                `metadata_version` Int32 DEFAULT 1,
+            )
+            ENGINE = MergeTree()
+            PARTITION BY toYYYYMM(event_date_time)
+            ORDER BY (event_date_time, event_type)
+            SETTINGS index_granularity = 8192
+            """,
+        ],
+    ),
+    # The sorting key can't be altered in place, so the table is rebuilt
+    # next to the old one and swapped atomically. Stop outbox workers while
+    # applying this one, or rows inserted between the copy and the swap are
+    # dropped with the old table.
+    EventLogMigration(
+        name='0002_typed_schema',
+        statements=[
+            'DROP TABLE IF EXISTS {database}.{table}__0002',
+            """
+            CREATE TABLE {database}.{table}__0002
+            (
+                `event_type` LowCardinality(String),
+                `event_date_time` DateTime64(6) CODEC(Delta, ZSTD(1)),
+                `environment` LowCardinality(String),
+                `event_context` String CODEC(ZSTD(3)),
+                `metadata_version` Int64 DEFAULT 1,
+                `email` String MATERIALIZED JSONExtractString(event_context, 'email'),
+                INDEX email_bloom_filter email TYPE bloom_filter(0.01) GRANULARITY 4
+            )
+            ENGINE = MergeTree()
+            PARTITION BY toYYYYMM(event_date_time)
+            ORDER BY (event_type, environment, event_date_time)
+            SETTINGS index_granularity = 8192
+            """,
+            """
+            INSERT INTO {database}.{table}__0002
+                (event_type, event_date_time, environment, event_context, metadata_version)
+            SELECT event_type, event_date_time, environment, event_context, metadata_version
+            FROM {database}.{table}
+            """,
+            'EXCHANGE TABLES {database}.{table}__0002 AND {database}.{table}',
+            'DROP TABLE {database}.{table}__0002',
+        ],
+    ),
+    # Rollups are backfilled from the existing rows, so stop outbox workers
+    # while applying this one or rows inserted meanwhile are counted twice.
+    EventLogMigration(
+        name='0003_rollups',
+        statements=[
+            *_rollup_statements('minute', 'toStartOfMinute'),
+            *_rollup_statements('hour', 'toStartOfHour'),
+            *_rollup_statements('day', 'toStartOfDay'),
+        ],
+    ),
+]
+
+
+class EventLogSchema:
+    """Applies `MIGRATIONS` to the event log and records them in ClickHouse."""
+
+    def __init__(self, client: Client) -> None:
+        self._client = client
+        self._database = settings.CLICKHOUSE_SCHEMA
+        self._table = settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME
+
+    def applied(self) -> set[str]:
+        self._ensure_migrations_table()
+        result = self._client.query(
+            f'SELECT name FROM {self._database}.{MIGRATIONS_TABLE_NAME}',  # noqa: S608
+        )
+        return {row[0] for row in result.result_rows}
+
+    def pending(self) -> list[EventLogMigration]:
+        applied = self.applied()
+        return [migration for migration in MIGRATIONS if migration.name not in applied]
+
+    def migrate(self) -> list[str]:
+        applied = []
+        for migration in self.pending():
+            logger.info('applying event log migration', migration=migration.name)
+            for statement in migration.statements:
+                self._client.command(statement.format(database=self._database, table=self._table))
+            self._client.insert(
+                data=[(migration.name, timezone.now())],
+                column_names=['name', 'applied_at'],
+                database=self._database,
+                table=MIGRATIONS_TABLE_NAME,
+            )
+            applied.append(migration.name)
+        return applied
+
+    def _ensure_migrations_table(self) -> None:
+        self._client.command(
+            f"""
+            CREATE TABLE IF NOT EXISTS {self._database}.{MIGRATIONS_TABLE_NAME}
+            (
+                `name` String,
+                `applied_at` DateTime64(6)
+            )
+            ENGINE = MergeTree()
+            ORDER BY name
+            """,
+        )
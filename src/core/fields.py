@@ -0,0 +1,58 @@
+from typing import Any
+
+import orjson
+from django.core import exceptions
+from django.db import models
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.postgresql.psycopg_any import Jsonb, is_psycopg3
+from django.db.models import expressions
+
+from core import json_codec
+
+
+class FastJSONField(models.JSONField):
+    """
+    Drop-in `JSONField` that encodes and decodes values with `core.json_codec`
+    instead of the stdlib `json` module. `encoder` and `decoder` are ignored.
+    """
+
+    def from_db_value(self, value: Any, expression: Any, connection: BaseDatabaseWrapper) -> Any:  # noqa: ANN401
+        if not isinstance(value, str | bytes):
+            return super().from_db_value(value, expression, connection)
+        try:
+            return json_codec.loads(value)
+        except orjson.JSONDecodeError:
+            return value
+
+    def get_db_prep_value(
+        self,
+        value: Any,  # noqa: ANN401
+        connection: BaseDatabaseWrapper,
+        prepared: bool = False,
+    ) -> Any:  # noqa: ANN401
+        if not prepared:
+            value = self.get_prep_value(value)
+        if isinstance(value, expressions.Value) and isinstance(value.output_field, models.JSONField):
+            value = value.value
+        elif hasattr(value, 'as_sql'):
+            return value
+        return self._adapt_json_value(value, connection)
+
+    @staticmethod
+    def _adapt_json_value(value: Any, connection: BaseDatabaseWrapper) -> Any:  # noqa: ANN401
+        # psycopg 3 sends the encoded bytes as is, other drivers get text
+        if connection.vendor == 'postgresql' and is_psycopg3:
+            return Jsonb(value, dumps=json_codec.dumps)
+        return json_codec.dumps(value).decode()
+
+    def validate(self, value: Any, model_instance: models.Model) -> None:  # noqa: ANN401
+        # Skips JSONField.validate, which checks the value with the stdlib encoder
+        models.Field.validate(self, value, model_instance)
+        try:
+            json_codec.dumps(value)
+        except TypeError as e:
+            raise exceptions.ValidationError(
+                self.error_messages['invalid'],
+                code='invalid',
+                params={'value': value},
+            ) from e
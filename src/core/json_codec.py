@@ -0,0 +1,23 @@
+import decimal
+from typing import Any
+
+import orjson
+
+# Non-string keys are stringified like the stdlib encoder does
+DUMPS_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:  # noqa: ANN401
+    # orjson encodes dates, datetimes and UUIDs natively, as ISO 8601 and
+    # canonical strings like the `core.base_model.Model` encoders do
+    if isinstance(value, decimal.Decimal | Exception):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(value: Any) -> bytes:  # noqa: ANN401
+    return orjson.dumps(value, default=_default, option=DUMPS_OPTIONS)
+
+
+def loads(value: bytes | str) -> Any:  # noqa: ANN401
+    return orjson.loads(value)
@@ -0,0 +1,38 @@
+import datetime as dt
+import decimal
+import uuid
+
+import pytest
+
+from core import json_codec
+from core.base_model import Model
+
+
+class Payload(Model):
+    created_at: dt.datetime
+    day: dt.date
+
+
+def test_datetimes_match_model_encoders() -> None:
+    payload = Payload(created_at=dt.datetime(2024, 1, 2, 3, 4, 5, 6, tzinfo=dt.UTC), day=dt.date(2024, 1, 2))
+
+    assert json_codec.loads(json_codec.dumps(payload.dict())) == json_codec.loads(payload.json())
+
+
+def test_decimals_uuids_and_exceptions_are_encoded_as_strings() -> None:
+    value = uuid.uuid4()
+
+    assert json_codec.loads(json_codec.dumps({
+        'amount': decimal.Decimal('1.10'),
+        'id': value,
+        'error': ValueError('boom'),
+    })) == {'amount': '1.10', 'id': str(value), 'error': 'boom'}
+
+
+def test_non_string_keys_are_stringified() -> None:
+    assert json_codec.loads(json_codec.dumps({1: 'a'})) == {'1': 'a'}
+
+
+def test_unsupported_types_raise() -> None:
+    with pytest.raises(TypeError):
+        json_codec.dumps({'value': object()})
@@ -0,0 +1,83 @@
+import threading
+import uuid
+from collections.abc import Callable, Generator
+from contextlib import contextmanager
+
+import redis
+
+from core.redis import get_redis
+
+# Both scripts only touch the key if it still holds the caller's token.
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaseSemaphore:
+    """
+    Cluster-wide semaphore with `limit` slots stored in Redis. Slots are
+    leases that expire unless renewed, so a crashed holder frees its slot.
+    A lease is an opaque string that can be passed between processes.
+    """
+
+    def __init__(self, name: str, limit: int, client: redis.Redis | None = None) -> None:
+        self._name = name
+        self._limit = limit
+        self._client = client or get_redis()
+
+    def acquire(self, ttl: float) -> str | None:
+        token = uuid.uuid4().hex
+        for slot in range(self._limit):
+            if self._client.set(self._key(slot), token, nx=True, px=int(ttl * 1000)):
+                return f'{slot}:{token}'
+        return None
+
+    def renew(self, lease: str, ttl: float) -> bool:
+        slot, token = lease.split(':', 1)
+        return bool(self._client.eval(RENEW_SCRIPT, 1, self._key(slot), token, int(ttl * 1000)))
+
+    @contextmanager
+    def keep_alive(self, lease: str, ttl: float) -> Generator[Callable[[], bool]]:
+        """
+        Renews `lease` from a background thread every third of `ttl` while the
+        block runs. Yields a function telling whether the lease is still held.
+        """
+        stopped, lost = threading.Event(), threading.Event()
+        thread = threading.Thread(
+            target=self._renew_until_stopped,
+            args=(lease, ttl, stopped, lost),
+            name=f'{self._name} lease',
+            daemon=True,
+        )
+        thread.start()
+        try:
+            yield lambda: not lost.is_set()
+        finally:
+            stopped.set()
+            thread.join()
+
+    def _renew_until_stopped(self, lease: str, ttl: float, stopped: threading.Event, lost: threading.Event) -> None:
+        while not stopped.wait(ttl / 3):
+            try:
+                if not self.renew(lease, ttl):
+                    lost.set()
+                    return
+            except redis.RedisError:
+                # Retried on the next tick, the lease outlives a few failures
+                continue
+
+    def release(self, lease: str) -> None:
+        slot, token = lease.split(':', 1)
+        self._client.eval(RELEASE_SCRIPT, 1, self._key(slot), token)
+
+    def _key(self, slot: int | str) -> str:
+        return f'{self._name}:{slot}'
@@ -0,0 +1,27 @@
+import time
+import uuid
+
+from core.locks import LeaseSemaphore
+from core.redis import get_redis
+
+
+def test_kept_alive_lease_outlives_its_ttl() -> None:
+    semaphore = LeaseSemaphore(f'test:{uuid.uuid4()}', limit=1)
+    lease = semaphore.acquire(ttl=0.3)
+
+    with semaphore.keep_alive(lease, ttl=0.3) as lease_held:
+        time.sleep(0.6)
+        assert lease_held()
+
+    assert semaphore.acquire(ttl=0.3) is None
+
+
+def test_lost_lease_is_reported() -> None:
+    name = f'test:{uuid.uuid4()}'
+    semaphore = LeaseSemaphore(name, limit=1)
+    lease = semaphore.acquire(ttl=0.3)
+
+    with semaphore.keep_alive(lease, ttl=0.3) as lease_held:
+        get_redis().delete(f'{name}:0')
+        time.sleep(0.2)
+        assert not lease_held()
@@ -0,0 +1,40 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache
+from typing import Any
+
+import billiard
+import django
+from billiard.pool import Pool
+from django.conf import settings
+
+
+def create_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Pool for CPU-bound work in non-daemonic processes, e.g. management
+    commands. Processes are spawned rather than forked, so they don't inherit
+    connections or threads, and set up Django before running anything.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup,
+    )
+
+
+@cache
+def get_process_pool() -> Pool:
+    """
+    Persistent per-process pool of `OUTBOX_PROCESS_POOL_SIZE` processes for
+    Celery workers. Prefork workers are daemonic billiard processes, which the
+    stdlib refuses to start children from, so this is a billiard pool.
+    """
+    return billiard.get_context('spawn').Pool(settings.OUTBOX_PROCESS_POOL_SIZE, initializer=django.setup)
+
+
+def shutdown_process_pool(**kwargs: Any) -> None:  # noqa: ANN401, ARG001
+    if get_process_pool.cache_info().currsize:
+        pool = get_process_pool()
+        get_process_pool.cache_clear()
+        pool.terminate()
+        pool.join()
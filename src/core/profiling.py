@@ -0,0 +1,79 @@
+import cProfile
+import os
+from collections.abc import Generator
+from contextlib import contextmanager
+from functools import cache
+from pathlib import Path
+
+import redis
+import structlog
+from django.conf import settings
+from django.utils import timezone
+
+from core.redis import fail_open, get_redis
+
+logger = structlog.get_logger(__name__)
+
+# Takes one batch from the requested count if any is left
+TAKE_SCRIPT = """
+local remaining = tonumber(redis.call('get', KEYS[1]) or '0')
+if remaining <= 0 then
+    return 0
+end
+redis.call('decr', KEYS[1])
+return 1
+"""
+
+
+@cache
+def get_batch_profiler() -> 'BatchProfiler':
+    return BatchProfiler('outbox:profile_batches')
+
+
+class BatchProfiler:
+    """
+    Profiles batches with cProfile and writes each profile to
+    `OUTBOX_PROFILE_DIR`, for `python -m pstats` or any pstats viewer.
+    Each process profiles its first `OUTBOX_PROFILE_BATCHES` batches, and
+    `request` asks for the next batches of all workers to be profiled.
+    """
+
+    def __init__(self, name: str, client: redis.Redis | None = None) -> None:
+        self._name = name
+        self._client = client or get_redis()
+        self._local_batches = settings.OUTBOX_PROFILE_BATCHES
+
+    def request(self, batches: int) -> None:
+        """Profiles the next `batches` batches, whichever workers process them."""
+        self._client.set(self._name, batches)
+
+    @contextmanager
+    def profile(self, label: str) -> Generator[None]:
+        if not self._take_batch():
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self._dump(profiler, label)
+
+    def _take_batch(self) -> bool:
+        if self._local_batches > 0:
+            self._local_batches -= 1
+            return True
+        return self._take_requested_batch()
+
+    @fail_open(False)
+    def _take_requested_batch(self) -> bool:
+        return bool(self._client.eval(TAKE_SCRIPT, 1, self._name))
+
+    def _dump(self, profiler: cProfile.Profile, label: str) -> None:
+        directory = Path(settings.OUTBOX_PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'{label}-{timezone.now():%Y%m%dT%H%M%S%f}-{os.getpid()}.prof'
+        profiler.dump_stats(path)
+        logger.info('Wrote batch profile', path=str(path))
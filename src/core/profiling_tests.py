@@ -0,0 +1,29 @@
+import uuid
+from pathlib import Path
+
+from django.test import override_settings
+
+from core.profiling import BatchProfiler
+
+
+def run_batches(profiler: BatchProfiler, count: int) -> None:
+    for _ in range(count):
+        with profiler.profile('batch'):
+            sum(range(1000))
+
+
+def test_first_batches_of_a_process_are_profiled(tmp_path: Path) -> None:
+    with override_settings(OUTBOX_PROFILE_BATCHES=2, OUTBOX_PROFILE_DIR=str(tmp_path)):
+        run_batches(BatchProfiler(f'test:{uuid.uuid4()}'), 3)
+
+    assert len(list(tmp_path.glob('batch-*.prof'))) == 2
+
+
+def test_requested_batches_are_profiled_once(tmp_path: Path) -> None:
+    name = f'test:{uuid.uuid4()}'
+    with override_settings(OUTBOX_PROFILE_BATCHES=0, OUTBOX_PROFILE_DIR=str(tmp_path)):
+        BatchProfiler(name).request(1)
+        run_batches(BatchProfiler(name), 1)
+        run_batches(BatchProfiler(name), 1)
+
+    assert len(list(tmp_path.glob('batch-*.prof'))) == 1
@@ -0,0 +1,54 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Mapping, Sequence
+from typing import Any
+
+MISSING = object()
+
+
+class QueryCache:
+    """Thread-safe LRU cache whose entries expire `ttl` seconds after being set."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(query: str, parameters: Mapping[str, Any] | Sequence[Any] | None = None) -> Hashable:
+        normalized_query = ' '.join(query.split())
+        if parameters is None:
+            return normalized_query, ()
+        if isinstance(parameters, Mapping):
+            return normalized_query, tuple(sorted((key, repr(value)) for key, value in parameters.items()))
+        return normalized_query, tuple(repr(value) for value in parameters)
+
+    def get(self, key: Hashable) -> Any:  # noqa: ANN401
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:  # noqa: ANN401
+        if self._maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
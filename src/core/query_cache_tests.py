@@ -0,0 +1,42 @@
+from unittest.mock import patch
+
+from core.query_cache import MISSING, QueryCache
+
+
+def test_key_is_normalized() -> None:
+    assert QueryCache.make_key('SELECT  1\n FROM t', {'b': 2, 'a': 1}) == QueryCache.make_key(
+        'SELECT 1 FROM t', {'a': 1, 'b': 2},
+    )
+
+
+def test_key_depends_on_parameters() -> None:
+    assert QueryCache.make_key('SELECT 1', {'a': 1}) != QueryCache.make_key('SELECT 1', {'a': 2})
+
+
+def test_least_recently_used_entry_is_evicted() -> None:
+    cache = QueryCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is MISSING
+    assert cache.get('c') == 3
+
+
+def test_expired_entry_is_dropped() -> None:
+    cache = QueryCache(maxsize=2, ttl=10)
+    with patch('core.query_cache.time.monotonic', return_value=100):
+        cache.set('a', 1)
+    with patch('core.query_cache.time.monotonic', return_value=110):
+        assert cache.get('a') is MISSING
+
+    assert len(cache) == 0
+
+
+def test_zero_maxsize_disables_cache() -> None:
+    cache = QueryCache(maxsize=0, ttl=60)
+    cache.set('a', 1)
+
+    assert cache.get('a') is MISSING
@@ -0,0 +1,52 @@
+import time
+
+import redis
+import structlog
+
+from core.redis import fail_open, get_redis
+
+logger = structlog.get_logger(__name__)
+
+# Refills the bucket for the elapsed time and takes `requested` tokens, going
+# into debt if there aren't enough. Returns the number of seconds until the
+# debt is paid back (as a string, since Redis truncates Lua numbers to
+# integers), so requests larger than the capacity are throttled too.
+ACQUIRE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local state = redis.call('hmget', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - updated_at, 0) * rate) - requested
+local wait = math.max(-tokens, 0) / rate
+redis.call('hset', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('expire', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+return tostring(wait)
+"""
+
+
+class TokenBucket:
+    """
+    Token bucket shared by all processes through Redis, refilled at `rate`
+    tokens per second and holding at most one second worth of tokens.
+    A `rate` of 0 disables the limit.
+    """
+
+    def __init__(self, name: str, rate: float, client: redis.Redis | None = None) -> None:
+        self._name = name
+        self._rate = rate
+        self._client = client or get_redis()
+
+    def acquire(self, amount: float, rate_fraction: float = 1.0) -> None:
+        """Takes `amount` tokens and blocks until the bucket is out of debt."""
+        if self._rate <= 0:
+            return
+        if (wait := self._try_acquire(amount, self._rate * rate_fraction)) > 0:
+            logger.debug('rate limited', name=self._name, wait=wait)
+            time.sleep(wait)
+
+    @fail_open(0.0)
+    def _try_acquire(self, amount: float, rate: float) -> float:
+        return float(self._client.eval(ACQUIRE_SCRIPT, 1, self._name, rate, rate, amount, time.time()))
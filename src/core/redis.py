@@ -0,0 +1,28 @@
+from collections.abc import Callable
+from functools import cache, wraps
+from typing import Any
+
+import redis
+import structlog
+from django.conf import settings
+
+logger = structlog.get_logger(__name__)
+
+
+@cache
+def get_redis() -> redis.Redis:
+    return redis.Redis.from_url(settings.REDIS_URL)
+
+
+def fail_open(default: Any) -> Callable:  # noqa: ANN401
+    """Makes the decorated method return `default` when Redis is unavailable."""
+    def decorator(method: Callable) -> Callable:
+        @wraps(method)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+            try:
+                return method(*args, **kwargs)
+            except redis.RedisError as e:
+                logger.warning('redis is unavailable', method=method.__qualname__, error=str(e))
+                return default
+        return wrapper
+    return decorator
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 import environ
@@ -14,6 +15,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 DEBUG = env.bool("DEBUG", default=False)
 ENVIRONMENT = env('ENVIRONMENT', default='Local')
+# `web` or `worker`, used to size resources per process type
+PROCESS_ROLE = env('PROCESS_ROLE', default='web')
 
 
 # Read the environment variables from the selected file
@@ -69,6 +72,32 @@ DATABASES = {
     "default": env.db("DATABASE_URL"),
 }
 
+# psycopg3 connection pool, sized separately for web and Celery worker
+# processes. Without it connections are persistent. Both are health-checked.
+DATABASE_POOL = env.bool("DATABASE_POOL", default=True)
+DATABASE_POOL_SIZES = {
+    "web": (
+        env.int("DATABASE_POOL_MIN_SIZE", default=2),
+        env.int("DATABASE_POOL_MAX_SIZE", default=10),
+    ),
+    "worker": (
+        env.int("DATABASE_WORKER_POOL_MIN_SIZE", default=1),
+        env.int("DATABASE_WORKER_POOL_MAX_SIZE", default=2),
+    ),
+}
+if DATABASE_POOL:
+    DATABASE_POOL_MIN_SIZE, DATABASE_POOL_MAX_SIZE = DATABASE_POOL_SIZES[PROCESS_ROLE]
+    DATABASES["default"].setdefault("OPTIONS", {})["pool"] = {
+        "min_size": DATABASE_POOL_MIN_SIZE,
+        "max_size": DATABASE_POOL_MAX_SIZE,
+        "timeout": env.float("DATABASE_POOL_TIMEOUT", default=10),
+    }
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = env.int("DATABASE_CONN_MAX_AGE", default=60)
+# With the pool, Django passes this to it as `check=ConnectionPool.check_connection`,
+# so connections dropped by the server are replaced before they are handed out.
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
 CLICKHOUSE_HOST = env('CLICKHOUSE_HOST', default='clickhouse')
 CLICKHOUSE_PORT = env('CLICKHOUSE_PORT', default=8123)
 CLICKHOUSE_USER = os.getenv('CLICKHOUSE_USER', default='')
@@ -80,6 +109,16 @@ CLICKHOUSE_URI = (
     f'{CLICKHOUSE_PROTOCOL}'
 )
 CLICKHOUSE_EVENT_LOG_TABLE_NAME = 'event_log'
+CLICKHOUSE_CONNECT_TIMEOUT = env.int('CLICKHOUSE_CONNECT_TIMEOUT', default=30)
+CLICKHOUSE_QUERY_CACHE_SIZE = env.int('CLICKHOUSE_QUERY_CACHE_SIZE', default=256)
+CLICKHOUSE_QUERY_CACHE_TTL = env.float('CLICKHOUSE_QUERY_CACHE_TTL', default=60)
+# Circuit breaker shared by all workers through Redis
+CLICKHOUSE_BREAKER_FAILURE_THRESHOLD = env.int('CLICKHOUSE_BREAKER_FAILURE_THRESHOLD', default=5)
+CLICKHOUSE_BREAKER_RESET_TIMEOUT = env.float('CLICKHOUSE_BREAKER_RESET_TIMEOUT', default=30)
+CLICKHOUSE_BREAKER_RAMP_SECONDS = env.float('CLICKHOUSE_BREAKER_RAMP_SECONDS', default=60)
+# Cluster-wide insert limits, 0 disables a limit
+CLICKHOUSE_INSERT_ROWS_PER_SECOND = env.float('CLICKHOUSE_INSERT_ROWS_PER_SECOND', default=0)
+CLICKHOUSE_INSERT_BYTES_PER_SECOND = env.float('CLICKHOUSE_INSERT_BYTES_PER_SECOND', default=0)
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -116,6 +155,34 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CELERY_BROKER = env("CELERY_BROKER", default="redis://localhost:6379/0")
 CELERY_ALWAYS_EAGER = env("CELERY_ALWAYS_EAGER", default=DEBUG)
 
+REDIS_URL = env("REDIS_URL", default=CELERY_BROKER)
+
+OUTBOX_BATCH_SIZE = env.int("OUTBOX_BATCH_SIZE", default=1000)
+# Partition keys claimed by a worker per batch, see users.outbox
+OUTBOX_PARTITIONS_PER_BATCH = env.int("OUTBOX_PARTITIONS_PER_BATCH", default=100)
+# Seconds to keep "latest wins" events pending so that updates collapse, see
+# users.prepare_events.CoalescePolicy. 0 only coalesces within a claimed batch.
+OUTBOX_COALESCE_WINDOW = env.float("OUTBOX_COALESCE_WINDOW", default=0)
+# Batches whose payloads add up to at least OUTBOX_PROCESS_POOL_THRESHOLD_BYTES
+# are prepared and serialized in a pool of this many processes, 0 disables it
+OUTBOX_PROCESS_POOL_SIZE = env.int("OUTBOX_PROCESS_POOL_SIZE", default=0)
+OUTBOX_PROCESS_POOL_THRESHOLD_BYTES = env.int("OUTBOX_PROCESS_POOL_THRESHOLD_BYTES", default=8 * 1024 * 1024)
+# Idle backoff of the self-rescheduling drain task, in seconds
+OUTBOX_POLL_MIN_DELAY = env.float("OUTBOX_POLL_MIN_DELAY", default=0.5)
+OUTBOX_POLL_MAX_DELAY = env.float("OUTBOX_POLL_MAX_DELAY", default=30)
+OUTBOX_POLL_BACKOFF_FACTOR = env.float("OUTBOX_POLL_BACKOFF_FACTOR", default=2)
+OUTBOX_DRAIN_CONCURRENCY = env.int("OUTBOX_DRAIN_CONCURRENCY", default=1)
+# A drain chain that doesn't renew its slot within this many seconds loses it
+OUTBOX_DRAIN_LEASE_TIMEOUT = env.float("OUTBOX_DRAIN_LEASE_TIMEOUT", default=60)
+# Backoff in seconds before retrying an event that couldn't be prepared, its
+# partition is parked meanwhile
+OUTBOX_RETRY_MIN_DELAY = env.float("OUTBOX_RETRY_MIN_DELAY", default=30)
+OUTBOX_RETRY_MAX_DELAY = env.float("OUTBOX_RETRY_MAX_DELAY", default=3600)
+# Batches profiled with cProfile by each worker process after it starts, more
+# can be requested with `celery -A core.celery control profile_outbox N`
+OUTBOX_PROFILE_BATCHES = env.int("OUTBOX_PROFILE_BATCHES", default=0)
+OUTBOX_PROFILE_DIR = env("OUTBOX_PROFILE_DIR", default=str(Path(tempfile.gettempdir()) / "outbox-profiles"))
+
 LOG_FORMATTER = env("LOG_FORMATTER", default="console")
 LOG_LEVEL = env("LOG_LEVEL", default="INFO")
 LOGGING = {
@@ -176,10 +243,18 @@ SENTRY_SETTINGS = {
     "dsn": env("SENTRY_CONFIG_DSN"),
     "environment": env("SENTRY_CONFIG_ENVIRONMENT"),
 }
+SENTRY_TRACES_SAMPLE_RATE = env.float("SENTRY_TRACES_SAMPLE_RATE", default=0.1)
+# The outbox drain runs back to back while there is a backlog
+SENTRY_OUTBOX_TRACES_SAMPLE_RATE = env.float("SENTRY_OUTBOX_TRACES_SAMPLE_RATE", default=0.01)
+# Share of sampled transactions also profiled by Sentry's sampling profiler
+SENTRY_PROFILES_SAMPLE_RATE = env.float("SENTRY_PROFILES_SAMPLE_RATE", default=0)
 
 if SENTRY_SETTINGS.get("dsn") and not DEBUG:
+    from core.tracing import traces_sampler
+
     sentry_sdk.init(
         dsn=SENTRY_SETTINGS["dsn"],
         environment=SENTRY_SETTINGS["environment"],
-        traces_sample_rate=1.0,
+        traces_sampler=traces_sampler,
+        profiles_sample_rate=SENTRY_PROFILES_SAMPLE_RATE,
     )
@@ -0,0 +1,35 @@
+from collections.abc import Generator
+from contextlib import contextmanager
+from typing import Any
+
+import sentry_sdk
+from django.conf import settings
+from sentry_sdk.tracing import Span
+
+# Celery tasks of the outbox drain, which runs back to back under load
+OUTBOX_TASKS = frozenset({'users.tasks.drain_event_outbox', 'users.tasks.process_event_outbox'})
+
+
+def traces_sampler(sampling_context: dict[str, Any]) -> float:
+    """
+    Samples outbox task transactions, started by Sentry's Celery integration,
+    at their own rate and keeps the parent's decision otherwise.
+    """
+    if (parent_sampled := sampling_context.get('parent_sampled')) is not None:
+        return float(parent_sampled)
+    if sampling_context.get('celery_job', {}).get('task') in OUTBOX_TASKS:
+        return settings.SENTRY_OUTBOX_TRACES_SAMPLE_RATE
+    return settings.SENTRY_TRACES_SAMPLE_RATE
+
+
+@contextmanager
+def trace_stage(op: str, name: str, **data: Any) -> Generator[Span]:  # noqa: ANN401
+    """
+    Times a stage as a child span of the current transaction, with `data`
+    such as row and byte counts attached. Spans outside a transaction are
+    not sent.
+    """
+    with sentry_sdk.start_span(op=op, name=name) as span:
+        for key, value in data.items():
+            span.set_data(key, value)
+        yield span
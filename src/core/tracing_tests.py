@@ -0,0 +1,24 @@
+import pytest
+from django.test import override_settings
+
+from core.tracing import traces_sampler
+
+
+@override_settings(SENTRY_TRACES_SAMPLE_RATE=0.5, SENTRY_OUTBOX_TRACES_SAMPLE_RATE=0.01)
+@pytest.mark.parametrize(
+    ('celery_job', 'parent_sampled', 'expected'),
+    [
+        ({'task': 'users.tasks.drain_event_outbox'}, None, 0.01),
+        ({'task': 'users.tasks.process_event_outbox'}, None, 0.01),
+        ({'task': 'users.tasks.other_task'}, None, 0.5),
+        (None, None, 0.5),
+        ({'task': 'users.tasks.process_event_outbox'}, True, 1.0),
+        (None, False, 0.0),
+    ],
+)
+def test_traces_sampler(celery_job: dict[str, str] | None, parent_sampled: bool | None, expected: float) -> None:
+    sampling_context = {'transaction_context': {'name': 'unknown'}, 'parent_sampled': parent_sampled}
+    if celery_job is not None:
+        sampling_context['celery_job'] = celery_job
+
+    assert traces_sampler(sampling_context) == expected
@@ -1,11 +1,14 @@
+import zlib
 from collections.abc import Sequence
 from typing import Any
 
 import structlog
-from sentry_sdk import start_transaction
+from django.conf import settings
 
 from core.base_model import Model
-from core.event_log_client import EventLogClient
+from core.event_log_client import EVENT_LOG_COLUMNS, EventLogClient, EventLogRecord, event_context_bytes
+from core.process_pool import get_process_pool, shutdown_process_pool
+from core.tracing import trace_stage
 from users.prepare_events import get_event_preparer
 
 logger = structlog.get_logger(__name__)
@@ -17,11 +20,90 @@ def prepare_clickhouse_record(event: dict[str, Any]) -> Model:
     preparer = get_event_preparer(event_type)
     return preparer.prepare_record(event_context)
 
-def batch_insert_into_clickhouse(events: Sequence[dict[str, Any]], chunk_size: int = 1000) -> None:
-    with start_transaction(op="task", name="Batch Insert Into Clickhouse"):
-        logger.info('Batch inserting into Clickhouse: %d events', len(events))
-        with EventLogClient.init() as client:
-            prepared_events = [prepare_clickhouse_record(event) for event in events]
-            res = client.insert(data=prepared_events, chunk_size=chunk_size)
-            logger.info('Successfully inserted %d events into Clickhouse', len(prepared_events))
-            return res
+def prepare_event_log_records(events: Sequence[dict[str, Any]]) -> tuple[list[EventLogRecord], list[int]]:
+    """
+    Prepares records for `events` and returns them with the ids of the events
+    they were prepared from. An event that can't be prepared is left out
+    together with the later events of its partition, so it holds back neither
+    the rest of the batch nor the order of its own partition.
+    """
+    records, event_ids, failed_partitions = [], [], set()
+    for event in events:
+        partition_key = event.get("partition_key")
+        if partition_key and partition_key in failed_partitions:
+            continue
+        record = _prepare_event_log_record(event)
+        if record is None:
+            failed_partitions.add(partition_key)
+            continue
+        records.append(record)
+        event_ids.append(event["id"])
+    return records, event_ids
+
+def _prepare_event_log_record(event: dict[str, Any]) -> EventLogRecord | None:
+    try:
+        return EventLogRecord(
+            event=prepare_clickhouse_record(event),
+            metadata_version=event.get("metadata_version", 1),
+            event_date_time=event.get("event_date_time"),
+        )
+    except Exception:
+        logger.exception('Unable to prepare Clickhouse record', event_id=event.get("id"))
+        return None
+
+def prepare_event_log_columns(events: Sequence[dict[str, Any]]) -> tuple[list[list[Any]], list[int]]:
+    with trace_stage('outbox.prepare', 'Prepare event log records', rows=len(events)):
+        records, event_ids = prepare_event_log_records(events)
+    with trace_stage('outbox.serialize', 'Serialize event log records', rows=len(records)) as span:
+        columns = EventLogClient.to_columns(records)
+        span.set_data('bytes', event_context_bytes(columns))
+    return columns, event_ids
+
+def prepare_event_log_columns_in_parallel(
+    events: Sequence[dict[str, Any]],
+) -> tuple[list[list[Any]], list[int]]:
+    """
+    Prepares and serializes `events` across the process pool. All events of a
+    partition go to the same process to keep their order and failure handling.
+    """
+    slices = [[] for _ in range(settings.OUTBOX_PROCESS_POOL_SIZE)]
+    for position, event in enumerate(events):
+        partition_key = event.get("partition_key")
+        slices[(zlib.crc32(partition_key.encode()) if partition_key else position) % len(slices)].append(event)
+
+    columns, event_ids = [[] for _ in EVENT_LOG_COLUMNS], []
+    with trace_stage(
+        'outbox.prepare',
+        'Prepare and serialize event log records in parallel',
+        rows=len(events),
+        processes=len(slices),
+    ):
+        for slice_columns, slice_event_ids in get_process_pool().map(prepare_event_log_columns, filter(None, slices)):
+            for column, slice_column in zip(columns, slice_columns, strict=True):
+                column.extend(slice_column)
+            event_ids.extend(slice_event_ids)
+    return columns, event_ids
+
+def _prepare_columns(events: Sequence[dict[str, Any]]) -> tuple[list[list[Any]], list[int]]:
+    # Small batches aren't worth the IPC overhead
+    batch_size = sum(event.get("context_size", 0) for event in events)
+    if settings.OUTBOX_PROCESS_POOL_SIZE <= 0 or batch_size < settings.OUTBOX_PROCESS_POOL_THRESHOLD_BYTES:
+        return prepare_event_log_columns(events)
+    try:
+        return prepare_event_log_columns_in_parallel(events)
+    except Exception:
+        # Failures of single events are handled inside, so this is the pool failing to start or losing a process
+        logger.exception('Process pool failed, preparing the batch in process')
+        shutdown_process_pool()
+        return prepare_event_log_columns(events)
+
+def batch_insert_into_clickhouse(events: Sequence[dict[str, Any]], chunk_size: int = 1000) -> list[int]:
+    """Inserts `events` and returns the ids of the ones written to Clickhouse."""
+    logger.info('Batch inserting into Clickhouse: %d events', len(events))
+    columns, event_ids = _prepare_columns(events)
+    if not event_ids:
+        return []
+    with EventLogClient.init() as client:
+        client.insert_columns(columns, chunk_size=chunk_size)
+        logger.info('Successfully inserted %d events into Clickhouse', len(event_ids))
+    return event_ids
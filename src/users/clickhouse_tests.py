@@ -0,0 +1,106 @@
+import datetime as dt
+from collections.abc import Generator
+from typing import Any
+from unittest.mock import patch
+
+import billiard
+import pytest
+from django.test import override_settings
+
+from core.event_log_client import event_context_bytes
+from core.process_pool import shutdown_process_pool
+from users.clickhouse import _prepare_columns, prepare_event_log_columns, prepare_event_log_columns_in_parallel
+from users.models import EventType
+
+
+@pytest.fixture()
+def f_process_pool() -> Generator:
+    with override_settings(OUTBOX_PROCESS_POOL_SIZE=2):
+        yield
+        shutdown_process_pool()
+
+
+def make_events(user_context: dict[str, str], count: int) -> list[dict[str, Any]]:
+    return [
+        {
+            'id': i,
+            'event_type': EventType.USER_UPDATED,
+            'event_context': {**user_context, 'last_name': f'Testovich {i}'},
+            'metadata_version': 1,
+            'partition_key': f'user:{i % 3}' if i % 2 else '',
+            'context_size': 1,
+        }
+        for i in range(count)
+    ]
+
+
+def test_parallel_preparation_matches_serial(user_context: dict[str, str], f_process_pool: None) -> None:  # noqa: ARG001
+    events = make_events(user_context, 10)
+    events[3]['event_context'] = {}
+
+    columns, event_ids = prepare_event_log_columns_in_parallel(events)
+    expected_columns, expected_event_ids = prepare_event_log_columns(events)
+
+    rows = sorted(zip(event_ids, columns[0], columns[3], strict=True))
+    assert rows == sorted(zip(expected_event_ids, expected_columns[0], expected_columns[3], strict=True))
+    # user:0 failed on its event 3, so its later event 9 is held back as well
+    assert sorted(event_ids) == [0, 1, 2, 4, 5, 6, 7, 8]
+
+
+def prepare_in_parallel(events: list[dict[str, Any]], results: billiard.SimpleQueue) -> None:
+    try:
+        results.put(prepare_event_log_columns_in_parallel(events)[1])
+    except Exception as e:
+        results.put(repr(e))
+    finally:
+        shutdown_process_pool()
+
+
+def test_parallel_preparation_in_daemonic_process(user_context: dict[str, str], f_process_pool: None) -> None:  # noqa: ARG001
+    # Like a Celery prefork worker
+    results = billiard.SimpleQueue()
+    worker = billiard.Process(target=prepare_in_parallel, args=(make_events(user_context, 4), results), daemon=True)
+    worker.start()
+    worker.join(timeout=60)
+
+    assert sorted(results.get()) == [0, 1, 2, 3]
+
+
+@override_settings(OUTBOX_PROCESS_POOL_SIZE=2, OUTBOX_PROCESS_POOL_THRESHOLD_BYTES=0)
+def test_preparation_falls_back_in_process_when_pool_fails(user_context: dict[str, str]) -> None:
+    events = make_events(user_context, 4)
+
+    with patch('users.clickhouse.get_process_pool', side_effect=AssertionError('daemonic processes are not allowed')):
+        columns, event_ids = _prepare_columns(events)
+
+    assert event_ids == [0, 1, 2, 3]
+    assert columns[3] == prepare_event_log_columns(events)[0][3]
+
+
+def test_event_context_size_is_measured_in_bytes(user_context: dict[str, str]) -> None:
+    columns, _ = prepare_event_log_columns([{
+        'id': 1,
+        'event_type': EventType.USER_CREATED,
+        'event_context': {**user_context, 'last_name': 'Тестович'},
+        'metadata_version': 1,
+    }])
+
+    assert event_context_bytes(columns) == len(columns[3][0].encode()) > len(columns[3][0])
+
+
+def test_event_date_time_is_taken_from_outbox(user_context: dict[str, str]) -> None:
+    created_at = dt.datetime(2024, 1, 1, tzinfo=dt.UTC)
+    events = [
+        {
+            'id': i,
+            'event_type': EventType.USER_CREATED,
+            'event_context': user_context,
+            'event_date_time': created_at + dt.timedelta(microseconds=i),
+            'metadata_version': 1,
+        }
+        for i in range(2)
+    ]
+
+    columns, _ = prepare_event_log_columns(events)
+
+    assert columns[1] == [event['event_date_time'] for event in events]
@@ -0,0 +1,43 @@
+from argparse import ArgumentParser
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from core.event_log_client import EventLogClient
+from core.event_log_schema import EventLogSchema
+
+
+class Command(BaseCommand):
+    help = 'Applies pending ClickHouse event log schema migrations.'
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            '--plan',
+            action='store_true',
+            help='Show pending migrations without applying them.',
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:  # noqa: ANN401, ARG002
+        client = EventLogClient.connect()
+        try:
+            schema = EventLogSchema(client)
+            if options['plan']:
+                self._show_plan(schema)
+            else:
+                self._migrate(schema)
+        finally:
+            client.close()
+
+    def _show_plan(self, schema: EventLogSchema) -> None:
+        pending = [migration.name for migration in schema.pending()]
+        for name in pending:
+            self.stdout.write(f'  {name}')
+        if not pending:
+            self.stdout.write('No pending event log migrations.')
+
+    def _migrate(self, schema: EventLogSchema) -> None:
+        applied = schema.migrate()
+        for name in applied:
+            self.stdout.write(self.style.SUCCESS(f'  Applied {name}'))
+        if not applied:
+            self.stdout.write('No pending event log migrations.')
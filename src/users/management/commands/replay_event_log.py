@@ -0,0 +1,166 @@
+import datetime as dt
+import os
+import time
+from argparse import ArgumentParser
+from collections.abc import Callable, Iterable
+from concurrent.futures import as_completed
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.process_pool import create_process_pool
+from users.replay import (
+    ReplayCheckpoint,
+    ReplayChunk,
+    ReplayChunkResult,
+    ReplayFilter,
+    plan_replay_chunks,
+    replay_chunk,
+    resolve_replay_range,
+)
+
+
+def parse_aware_datetime(value: str) -> dt.datetime:
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+class Command(BaseCommand):
+    help = (
+        'Replays outbox events, processed or not, into the ClickHouse event log. '
+        'Events are inserted again, so only replay ranges missing from it.'
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument('--from-id', type=int, help='First outbox event id to replay.')
+        parser.add_argument('--to-id', type=int, help='Last outbox event id to replay.')
+        parser.add_argument('--since', type=parse_aware_datetime, help='Replay events created at or after.')
+        parser.add_argument('--until', type=parse_aware_datetime, help='Replay events created before.')
+        parser.add_argument(
+            '--event-type',
+            action='append',
+            default=[],
+            dest='event_types',
+            help='Event type to replay, can be repeated.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=100_000, help='Outbox ids per parallel chunk.')
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Events per ClickHouse insert.')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Processes replaying chunks in parallel, 0 replays in this process.',
+        )
+        parser.add_argument(
+            '--rows-per-second',
+            type=float,
+            default=0,
+            help='Caps replay throughput across all workers, 0 means unlimited.',
+        )
+        parser.add_argument('--checkpoint', type=Path, help='File recording replayed chunks, to resume from.')
+
+    def handle(self, *args: Any, **options: Any) -> None:  # noqa: ANN401, ARG002
+        replay_filter = ReplayFilter(
+            first_id=options['from_id'],
+            last_id=options['to_id'],
+            since=options['since'],
+            until=options['until'],
+            event_types=options['event_types'],
+        )
+        checkpoint = self._load_checkpoint(
+            ReplayCheckpoint(options['checkpoint'], replay_filter, options['chunk_size']),
+            replay_filter,
+        )
+        chunks = plan_replay_chunks(checkpoint.replay_range, options['chunk_size'])
+        pending = [chunk for chunk in chunks if not checkpoint.is_done(chunk)]
+        self.stdout.write(f'Replaying {len(pending)} of {len(chunks)} chunks with {options["workers"]} workers')
+
+        replay = partial(
+            replay_chunk,
+            replay_filter,
+            batch_size=options['batch_size'],
+            rows_per_second=options['rows_per_second'],
+        )
+        progress = ReplayProgress(self, total=len(pending))
+        for chunk, get_result in self._replay(pending, replay, options['workers']):
+            try:
+                result = get_result()
+            except Exception as e:
+                progress.chunk_failed(chunk, e)
+                continue
+            checkpoint.add(chunk)
+            progress.chunk_done(result)
+        progress.finish()
+        if progress.failed:
+            raise CommandError(f'{progress.failed} chunks failed, run the command again to retry them')
+
+    def _load_checkpoint(self, checkpoint: ReplayCheckpoint, replay_filter: ReplayFilter) -> ReplayCheckpoint:
+        try:
+            checkpoint.load()
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+        if checkpoint.replay_range is None:
+            checkpoint.replay_range = resolve_replay_range(replay_filter)
+        else:
+            self.stdout.write(f'Resuming, {len(checkpoint.done)} chunks already replayed')
+        return checkpoint
+
+    def _replay(
+        self,
+        chunks: list[ReplayChunk],
+        replay: Callable[[ReplayChunk], ReplayChunkResult],
+        workers: int,
+    ) -> Iterable[tuple[ReplayChunk, Callable[[], ReplayChunkResult]]]:
+        """Yields chunks as they complete, with a callable returning or raising their result."""
+        if workers <= 0:
+            for chunk in chunks:
+                yield chunk, partial(replay, chunk)
+            return
+
+        pool = create_process_pool(workers)
+        try:
+            futures = {pool.submit(replay, chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                yield futures[future], future.result
+        finally:
+            # Don't start the remaining chunks when interrupted
+            pool.shutdown(cancel_futures=True)
+
+
+class ReplayProgress:
+    def __init__(self, command: BaseCommand, total: int) -> None:
+        self._command = command
+        self._total = total
+        self._started_at = time.monotonic()
+        self.completed = self.failed = self.replayed = self.skipped = 0
+
+    def chunk_done(self, result: ReplayChunkResult) -> None:
+        self.completed += 1
+        self.replayed += result.replayed
+        self.skipped += result.skipped
+        self._command.stdout.write(
+            f'[{self.completed + self.failed}/{self._total}] ids {result.chunk.first_id}-{result.chunk.last_id}: '
+            f'{result.replayed} events, {self.replayed} total, {self._throughput():.0f} events/s',
+        )
+
+    def chunk_failed(self, chunk: ReplayChunk, error: Exception) -> None:
+        self.failed += 1
+        self._command.stderr.write(
+            f'[{self.completed + self.failed}/{self._total}] ids {chunk.first_id}-{chunk.last_id} failed: {error}',
+        )
+
+    def finish(self) -> None:
+        elapsed = time.monotonic() - self._started_at
+        self._command.stdout.write(self._command.style.SUCCESS(
+            f'Replayed {self.replayed} events in {elapsed:.1f}s ({self._throughput():.0f} events/s), '
+            f'{self.skipped} skipped, {self.failed} chunks failed',
+        ))
+
+    def _throughput(self) -> float:
+        return self.replayed / max(time.monotonic() - self._started_at, 1e-9)
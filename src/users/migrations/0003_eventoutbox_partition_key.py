@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-19 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_eventoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventoutbox',
+            name='partition_key',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='eventoutbox',
+            name='event_type',
+            field=models.CharField(
+                choices=[('UserCreated', 'User Created'), ('UserUpdated', 'User Updated')], max_length=50,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='eventoutbox',
+            index=models.Index(
+                condition=models.Q(('processed', False)),
+                fields=['partition_key', 'id'],
+                name='outbox_pending_partition_idx',
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.2 on 2026-10-19 14:12
+
+from django.db import migrations
+
+import core.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_eventoutbox_partition_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='eventoutbox',
+            name='event_context',
+            field=core.fields.FastJSONField(),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-19 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_eventoutbox_fast_json_context'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventoutbox',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='eventoutbox',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
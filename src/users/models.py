@@ -1,6 +1,8 @@
 from django.contrib.auth.models import AbstractBaseUser
 from django.db import models
+from django.db.models import Q
 
+from core.fields import FastJSONField
 from core.models import TimeStampedModel
 
 
@@ -36,6 +38,22 @@ class EventOutbox(models.Model):
     )
     event_date_time = models.DateTimeField(auto_now_add=True)
     environment = models.CharField(max_length=255)
-    event_context = models.JSONField()
+    event_context = FastJSONField()
     metadata_version = models.BigIntegerField()
     processed = models.BooleanField(default=False)
+    # Events sharing a partition key (e.g. the aggregate id) are delivered in
+    # order; events without one are delivered in any order.
+    partition_key = models.CharField(max_length=255, blank=True, default='')
+    # Events that can't be prepared are retried with backoff, see
+    # users.outbox.park_failed_outbox_events
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['partition_key', 'id'],
+                condition=Q(processed=False),
+                name='outbox_pending_partition_idx',
+            ),
+        ]
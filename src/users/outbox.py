@@ -0,0 +1,170 @@
+import datetime as dt
+from collections.abc import Iterable
+from typing import Any
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Func, IntegerField, Max, Min, Q, TextField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from users.prepare_events import CoalescePolicy, get_coalesce_policy
+
+from .models import EventOutbox
+
+OUTBOX_FIELDS = (
+    "id", "event_context", "event_type", "event_date_time", "metadata_version", "partition_key", "context_size",
+)
+# Serialized size of the payload, lets the worker size batches without encoding them
+CONTEXT_SIZE = Func(Cast("event_context", TextField()), function="octet_length", output_field=IntegerField())
+
+# First key of the two-key advisory locks taken on partition keys
+PARTITION_LOCK_NAMESPACE = 0x0B0C
+
+
+def claim_outbox_events(batch_size: int) -> list[dict[str, Any]]:
+    """
+    Claims up to `batch_size` pending events ordered by id. Must be called in
+    a transaction, which holds the claim until it ends.
+
+    Keyed events are claimed by whole partitions that no other worker holds,
+    so per-key order is kept while other workers drain other keys. Events
+    without a partition key are claimed row by row.
+    """
+    events = _claim_partitions(batch_size)
+    if len(events) < batch_size:
+        events += EventOutbox.objects.select_for_update(
+            skip_locked=True,
+        ).filter(_is_due(), processed=False, partition_key='').order_by("id").annotate(
+            context_size=CONTEXT_SIZE,
+        ).values(*OUTBOX_FIELDS)[:batch_size - len(events)]
+    return sorted(events, key=lambda event: event["id"])
+
+
+def _claim_partitions(batch_size: int) -> list[dict[str, Any]]:
+    # Oldest pending partitions first, leaving out parked ones; extra
+    # candidates make up for the ones locked by concurrent workers.
+    candidates = EventOutbox.objects.filter(processed=False).exclude(partition_key='').values(
+        "partition_key",
+    ).annotate(first_id=Min("id"), parked_until=Max("next_attempt_at")).filter(
+        _is_due("parked_until"),
+    ).order_by("first_id").values_list("partition_key", flat=True)[
+        :settings.OUTBOX_PARTITIONS_PER_BATCH * settings.OUTBOX_DRAIN_CONCURRENCY
+    ]
+
+    partition_keys = _lock_partitions(candidates)
+    if not partition_keys:
+        return []
+
+    # A global id order keeps every partition's events a gap-free prefix
+    return _hold_back_coalescing_window(list(
+        EventOutbox.objects.filter(processed=False, partition_key__in=partition_keys).order_by("id").annotate(
+            context_size=CONTEXT_SIZE,
+        ).values(
+            *OUTBOX_FIELDS,
+        )[:batch_size],
+    ))
+
+
+def _is_due(field: str = "next_attempt_at") -> Q:
+    return Q(**{f"{field}__isnull": True}) | Q(**{f"{field}__lte": timezone.now()})
+
+
+def park_failed_outbox_events(events: list[dict[str, Any]], shipped_ids: Iterable[int]) -> list[int]:
+    """
+    Schedules a retry, with exponential backoff, of the claimed events that
+    failed to be prepared and returns their ids. Later events of a failed
+    partition were held back behind it and stay pending as they are; the
+    partition isn't claimed again until the failed event is due.
+    """
+    failed_ids = _failed_event_ids(events, shipped_ids)
+    now = timezone.now()
+    failed_events = list(EventOutbox.objects.filter(id__in=failed_ids).only("id", "attempts"))
+    for event in failed_events:
+        event.attempts += 1
+        delay = settings.OUTBOX_RETRY_MIN_DELAY * 2 ** (event.attempts - 1)
+        event.next_attempt_at = now + dt.timedelta(seconds=min(delay, settings.OUTBOX_RETRY_MAX_DELAY))
+    EventOutbox.objects.bulk_update(failed_events, ["attempts", "next_attempt_at"])
+    return failed_ids
+
+
+def _failed_event_ids(events: list[dict[str, Any]], shipped_ids: Iterable[int]) -> list[int]:
+    # Preparation stops at the first failure of a partition
+    shipped_ids, failed_partitions, failed_ids = set(shipped_ids), set(), []
+    for event in events:
+        if event["id"] in shipped_ids or event["partition_key"] in failed_partitions:
+            continue
+        failed_ids.append(event["id"])
+        if event["partition_key"]:
+            failed_partitions.add(event["partition_key"])
+    return failed_ids
+
+
+def _hold_back_coalescing_window(events: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Leaves a partition pending, from its first coalescable event on, until
+    that event is `OUTBOX_COALESCE_WINDOW` seconds old, so that updates made
+    meanwhile collapse into one.
+    """
+    if settings.OUTBOX_COALESCE_WINDOW <= 0:
+        return events
+
+    cutoff = timezone.now() - dt.timedelta(seconds=settings.OUTBOX_COALESCE_WINDOW)
+    first_coalescable = {}
+    for event in filter(_is_coalescable, events):
+        first_coalescable.setdefault(event["partition_key"], event)
+    held_back_from = {
+        partition_key: event["id"]
+        for partition_key, event in first_coalescable.items()
+        if event["event_date_time"] > cutoff
+    }
+    return [
+        event for event in events
+        if event["id"] < held_back_from.get(event["partition_key"], event["id"] + 1)
+    ]
+
+
+def coalesce_outbox_events(events: list[dict[str, Any]]) -> tuple[list[dict[str, Any]], dict[int, list[int]]]:
+    """
+    Collapses claimed events of "latest wins" types into the latest one per
+    event type and partition. Returns the events to ship and the ids of the
+    events superseded by each shipped one, which are acknowledged without
+    being shipped once it is written.
+    """
+    latest_ids = {
+        (event["event_type"], event["partition_key"]): event["id"]
+        for event in events
+        if _is_coalescable(event)
+    }
+    shipped, superseded = [], {}
+    for event in events:
+        latest_id = latest_ids[(event["event_type"], event["partition_key"])] if _is_coalescable(event) else event["id"]
+        if latest_id == event["id"]:
+            shipped.append(event)
+        else:
+            superseded.setdefault(latest_id, []).append(event["id"])
+    return shipped, superseded
+
+
+def _is_coalescable(event: dict[str, Any]) -> bool:
+    # Events without a partition key have no aggregate to collapse into
+    return bool(event["partition_key"]) and get_coalesce_policy(event["event_type"]) == CoalescePolicy.LATEST_WINS
+
+
+def _lock_partitions(candidates: Iterable[str]) -> list[str]:
+    partition_keys = []
+    for partition_key in candidates:
+        if _try_lock_partition(partition_key):
+            partition_keys.append(partition_key)
+        if len(partition_keys) == settings.OUTBOX_PARTITIONS_PER_BATCH:
+            break
+    return partition_keys
+
+
+def _try_lock_partition(partition_key: str) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_try_advisory_xact_lock(%s, hashtext(%s))",
+            [PARTITION_LOCK_NAMESPACE, partition_key],
+        )
+        return cursor.fetchone()[0]
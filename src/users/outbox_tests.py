@@ -0,0 +1,128 @@
+from collections.abc import Generator
+from unittest.mock import patch
+
+import pytest
+from clickhouse_connect.driver import Client
+from django.conf import settings
+from django.db import transaction
+from django.test import override_settings
+
+from users.models import EventOutbox, EventType
+from users.outbox import claim_outbox_events, coalesce_outbox_events
+from users.tasks import process_event_outbox
+from users.use_cases import CreateUser, CreateUserRequest, UpdateUser, UpdateUserRequest, UserCreated, UserUpdated
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture(autouse=True)
+def f_clean_up_event_log(f_ch_client: Client) -> Generator:
+    f_ch_client.query(f'TRUNCATE TABLE {settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME}')
+    yield
+
+
+def create_event(event_context: dict[str, str], partition_key: str = '') -> EventOutbox:
+    return EventOutbox.objects.create(
+        event_type=EventType.USER_CREATED,
+        environment='test',
+        event_context=event_context,
+        metadata_version=1,
+        partition_key=partition_key,
+    )
+
+
+def test_events_are_claimed_in_id_order(user_context: dict[str, str]) -> None:
+    events = [
+        create_event(user_context, partition_key='user:1'),
+        create_event(user_context),
+        create_event(user_context, partition_key='user:2'),
+        create_event(user_context, partition_key='user:1'),
+    ]
+
+    with transaction.atomic():
+        claimed = claim_outbox_events(batch_size=10)
+
+    assert [event['id'] for event in claimed] == [event.id for event in events]
+
+
+def test_locked_partition_is_skipped(user_context: dict[str, str]) -> None:
+    create_event(user_context, partition_key='user:1')
+    free = create_event(user_context, partition_key='user:2')
+
+    with transaction.atomic(), patch(
+        'users.outbox._try_lock_partition',
+        side_effect=lambda partition_key: partition_key != 'user:1',
+    ):
+        claimed = claim_outbox_events(batch_size=10)
+
+    assert [event['id'] for event in claimed] == [free.id]
+
+
+def test_failing_partition_does_not_block_others(user_context: dict[str, str]) -> None:
+    broken = create_event({'email': 'broken@email.com'}, partition_key='user:1')
+    blocked = create_event(user_context, partition_key='user:1')
+    other = create_event(user_context, partition_key='user:2')
+    unkeyed = create_event(user_context)
+
+    process_event_outbox()
+
+    assert list(
+        EventOutbox.objects.filter(processed=True).order_by('id').values_list('id', flat=True),
+    ) == [other.id, unkeyed.id]
+    assert not EventOutbox.objects.filter(id__in=[broken.id, blocked.id], processed=True).exists()
+
+
+def test_latest_update_wins() -> None:
+    events = [
+        {'id': 1, 'event_type': EventType.USER_CREATED, 'partition_key': 'user:1'},
+        {'id': 2, 'event_type': EventType.USER_UPDATED, 'partition_key': 'user:1'},
+        {'id': 3, 'event_type': EventType.USER_UPDATED, 'partition_key': 'user:2'},
+        {'id': 4, 'event_type': EventType.USER_UPDATED, 'partition_key': ''},
+        {'id': 5, 'event_type': EventType.USER_UPDATED, 'partition_key': ''},
+        {'id': 6, 'event_type': EventType.USER_UPDATED, 'partition_key': 'user:1'},
+    ]
+
+    shipped, superseded = coalesce_outbox_events(events)
+
+    assert [event['id'] for event in shipped] == [1, 3, 4, 5, 6]
+    assert superseded == {6: [2]}
+
+
+@override_settings(OUTBOX_COALESCE_WINDOW=60)
+def test_recent_updates_are_held_back(user_context: dict[str, str]) -> None:
+    created = create_event(user_context, partition_key='user:1')
+    EventOutbox.objects.create(
+        event_type=EventType.USER_UPDATED,
+        environment='test',
+        event_context=user_context,
+        metadata_version=1,
+        partition_key='user:1',
+    )
+
+    with transaction.atomic():
+        claimed = claim_outbox_events(batch_size=10)
+
+    assert [event['id'] for event in claimed] == [created.id]
+
+
+def test_user_updates_are_coalesced(f_ch_client: Client) -> None:
+    CreateUser().execute(CreateUserRequest(email='test@email.com', first_name='Test', last_name='Testovich'))
+    for last_name in ['First', 'Second', 'Third']:
+        UpdateUser().execute(UpdateUserRequest(email='test@email.com', first_name='Test', last_name=last_name))
+
+    process_event_outbox()
+    log = f_ch_client.query(
+        f'SELECT event_type, event_context FROM {settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME} ORDER BY event_type',  # noqa: S608
+    )
+
+    assert not EventOutbox.objects.filter(processed=False).exists()
+    assert log.result_rows == [
+        (
+            'user_created',
+            UserCreated(email='test@email.com', first_name='Test', last_name='Testovich').model_dump_json(),
+        ),
+        (
+            'user_updated',
+            UserUpdated(email='test@email.com', first_name='Test', last_name='Third').model_dump_json(),
+        ),
+    ]
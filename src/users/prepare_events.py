@@ -1,16 +1,26 @@
 from abc import ABC, abstractmethod
+from enum import StrEnum
 from typing import Any
 
 import structlog
 
 from core.base_model import Model
-from users.use_cases import UserCreated
+from users.use_cases import UserCreated, UserUpdated
 
 from .models import EventType
 
 logger = structlog.get_logger(__name__)
 
+class CoalescePolicy(StrEnum):
+    # Every event is shipped
+    NEVER = 'never'
+    # Pending events of the same type and partition collapse into the latest one
+    LATEST_WINS = 'latest_wins'
+
 class EventRecordPreparer(ABC):
+    # Creation and audit-critical events must never be coalesced
+    coalesce_policy = CoalescePolicy.NEVER
+
     @abstractmethod
     def prepare_record(self, event_context: dict[str, Any]) -> Model:
         pass
@@ -23,8 +33,28 @@ class UserCreatedPreparer(EventRecordPreparer):
             last_name=event_context['last_name'],
         )
 
+class UserUpdatedPreparer(EventRecordPreparer):
+    coalesce_policy = CoalescePolicy.LATEST_WINS
+
+    def prepare_record(self, event_context: dict[str, str]) -> UserUpdated:
+        return UserUpdated(
+            email=event_context['email'],
+            first_name=event_context['first_name'],
+            last_name=event_context['last_name'],
+        )
+
 # Extension point for future events
+EVENT_PREPARERS: dict[str, type[EventRecordPreparer]] = {
+    EventType.USER_CREATED: UserCreatedPreparer,
+    EventType.USER_UPDATED: UserUpdatedPreparer,
+}
+
 def get_event_preparer(event_type: str) -> EventRecordPreparer:
-    if event_type == EventType.USER_CREATED:
-        return UserCreatedPreparer()
+    if event_type in EVENT_PREPARERS:
+        return EVENT_PREPARERS[event_type]()
     raise ValueError(f"Unsupported event type: {event_type}")
+
+def get_coalesce_policy(event_type: str) -> CoalescePolicy:
+    if event_type in EVENT_PREPARERS:
+        return EVENT_PREPARERS[event_type].coalesce_policy
+    return CoalescePolicy.NEVER
@@ -0,0 +1,142 @@
+import datetime as dt
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+from django.db.models import Max, Min, QuerySet
+from sentry_sdk import start_transaction
+
+from core import json_codec
+from core.base_model import Model
+from core.event_log_client import EventLogClient
+from core.rate_limiter import TokenBucket
+from users.clickhouse import prepare_event_log_columns
+
+from .models import EventOutbox
+
+REPLAY_FIELDS = ("id", "event_context", "event_type", "event_date_time", "metadata_version", "partition_key")
+
+# Shared by all replay processes, separately from the ClickHouse insert limits
+REPLAY_RATE_LIMITER_NAME = 'event_log:replay_rows'
+
+
+class ReplayFilter(Model):
+    """Selects outbox events to replay, whether they were processed or not."""
+
+    first_id: int | None = None
+    last_id: int | None = None
+    since: dt.datetime | None = None
+    until: dt.datetime | None = None
+    event_types: list[str] = []
+
+    def queryset(self) -> QuerySet[EventOutbox]:
+        lookups = {
+            'id__gte': self.first_id,
+            'id__lte': self.last_id,
+            'event_date_time__gte': self.since,
+            'event_date_time__lt': self.until,
+            'event_type__in': self.event_types or None,
+        }
+        return EventOutbox.objects.filter(**{lookup: value for lookup, value in lookups.items() if value is not None})
+
+
+class ReplayChunk(Model):
+    first_id: int
+    last_id: int
+
+
+class ReplayChunkResult(Model):
+    chunk: ReplayChunk
+    replayed: int = 0
+    skipped: int = 0
+
+
+def resolve_replay_range(replay_filter: ReplayFilter) -> ReplayChunk | None:
+    """Returns the id range of the selected events, None when there are none."""
+    bounds = replay_filter.queryset().aggregate(first_id=Min('id'), last_id=Max('id'))
+    if bounds['first_id'] is None:
+        return None
+    return ReplayChunk(**bounds)
+
+
+def plan_replay_chunks(replay_range: ReplayChunk | None, chunk_size: int) -> list[ReplayChunk]:
+    """Splits `replay_range` into chunks of `chunk_size` ids."""
+    if replay_range is None:
+        return []
+    return [
+        ReplayChunk(first_id=first_id, last_id=min(first_id + chunk_size - 1, replay_range.last_id))
+        for first_id in range(replay_range.first_id, replay_range.last_id + 1, chunk_size)
+    ]
+
+
+def replay_chunk(
+    replay_filter: ReplayFilter,
+    chunk: ReplayChunk,
+    batch_size: int,
+    rows_per_second: float = 0,
+) -> ReplayChunkResult:
+    """
+    Re-exports the selected events of `chunk` to the event log, `batch_size`
+    events at a time. Runs in replay worker processes.
+    """
+    queryset = replay_filter.queryset().filter(id__range=(chunk.first_id, chunk.last_id)).order_by('id')
+    rate_limiter = TokenBucket(REPLAY_RATE_LIMITER_NAME, rows_per_second)
+    result = ReplayChunkResult(chunk=chunk)
+    with start_transaction(op="task", name="Replay Event Log Chunk"), EventLogClient.init() as client:
+        for events in _iterate_batches(queryset, batch_size):
+            columns, event_ids = prepare_event_log_columns(events)
+            rate_limiter.acquire(len(event_ids))
+            if event_ids:
+                client.insert_columns(columns, chunk_size=batch_size)
+            result.replayed += len(event_ids)
+            result.skipped += len(events) - len(event_ids)
+    return result
+
+
+def _iterate_batches(queryset: QuerySet[EventOutbox], batch_size: int) -> Iterable[list[dict[str, Any]]]:
+    # Keyset pagination, so no cursor stays open while batches are inserted
+    last_id = 0
+    while events := list(queryset.filter(id__gt=last_id).values(*REPLAY_FIELDS)[:batch_size]):
+        yield events
+        last_id = events[-1]['id']
+
+
+class ReplayCheckpoint:
+    """
+    Keeps track of the replayed chunks, in a JSON file when `path` is given,
+    so an interrupted replay resumes where it stopped. A file is only reused
+    for the same filter and chunk size, and keeps the id range resolved by
+    the first run, so events created since don't shift the chunks.
+    """
+
+    def __init__(self, path: Path | None, replay_filter: ReplayFilter, chunk_size: int) -> None:
+        self._path = path
+        self._key = json_codec.loads(json_codec.dumps({'filter': replay_filter.dict(), 'chunk_size': chunk_size}))
+        self.replay_range: ReplayChunk | None = None
+        self.done: set[tuple[int, int]] = set()
+
+    def load(self) -> None:
+        """Loads the id range and the (first id, last id) of the chunks already replayed."""
+        if self._path is None or not self._path.exists():
+            return
+        state = json_codec.loads(self._path.read_bytes())
+        if state['key'] != self._key:
+            raise ValueError(f'Checkpoint {self._path} was written for a different replay')
+        self.replay_range = ReplayChunk(**state['range'])
+        self.done = set(map(tuple, state['done']))
+
+    def is_done(self, chunk: ReplayChunk) -> bool:
+        return (chunk.first_id, chunk.last_id) in self.done
+
+    def add(self, chunk: ReplayChunk) -> None:
+        self.done.add((chunk.first_id, chunk.last_id))
+        if self._path is None:
+            return
+        # Written next to the checkpoint and renamed, so it is never left half-written
+        temporary_path = self._path.with_name(f'{self._path.name}.tmp')
+        temporary_path.write_bytes(json_codec.dumps({
+            'key': self._key,
+            'range': self.replay_range.dict() if self.replay_range else None,
+            'done': sorted(self.done),
+        }))
+        temporary_path.replace(self._path)
@@ -0,0 +1,121 @@
+import datetime as dt
+from collections.abc import Generator
+from io import StringIO
+from pathlib import Path
+
+import pytest
+from clickhouse_connect.driver import Client
+from django.conf import settings
+from django.core.management import call_command
+
+from users.models import EventOutbox, EventType
+from users.replay import ReplayCheckpoint, ReplayChunk, ReplayFilter, plan_replay_chunks, resolve_replay_range
+
+
+@pytest.fixture()
+def f_clean_up_event_log(f_ch_client: Client) -> Generator:
+    f_ch_client.query(f'TRUNCATE TABLE {settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME}')
+    yield
+
+
+def create_events(user_context: dict[str, str], count: int, event_type: str = EventType.USER_CREATED) -> list[int]:
+    return [
+        EventOutbox.objects.create(
+            event_type=event_type,
+            environment='test',
+            event_context=user_context,
+            metadata_version=1,
+            processed=True,
+        ).id
+        for _ in range(count)
+    ]
+
+
+def test_checkpoint_resumes_replayed_chunks(tmp_path: Path) -> None:
+    replay_filter = ReplayFilter(first_id=1, event_types=[EventType.USER_CREATED])
+    checkpoint = ReplayCheckpoint(tmp_path / 'replay.json', replay_filter, chunk_size=10)
+    checkpoint.replay_range = ReplayChunk(first_id=1, last_id=25)
+    checkpoint.add(ReplayChunk(first_id=1, last_id=10))
+
+    resumed = ReplayCheckpoint(tmp_path / 'replay.json', replay_filter, chunk_size=10)
+    resumed.load()
+
+    assert resumed.replay_range == ReplayChunk(first_id=1, last_id=25)
+    assert resumed.is_done(ReplayChunk(first_id=1, last_id=10))
+    assert not resumed.is_done(ReplayChunk(first_id=1, last_id=5))
+
+
+def test_checkpoint_of_another_replay_is_rejected(tmp_path: Path) -> None:
+    ReplayCheckpoint(tmp_path / 'replay.json', ReplayFilter(), chunk_size=10).add(ReplayChunk(first_id=1, last_id=10))
+
+    with pytest.raises(ValueError, match='different replay'):
+        ReplayCheckpoint(tmp_path / 'replay.json', ReplayFilter(), chunk_size=20).load()
+
+
+@pytest.mark.django_db
+def test_chunks_cover_selected_ids(user_context: dict[str, str]) -> None:
+    ids = create_events(user_context, 5)
+
+    chunks = plan_replay_chunks(resolve_replay_range(ReplayFilter(first_id=ids[1])), chunk_size=2)
+
+    assert [(chunk.first_id, chunk.last_id) for chunk in chunks] == [(ids[1], ids[2]), (ids[3], ids[4])]
+
+
+@pytest.mark.django_db
+def test_resumed_replay_keeps_its_chunks(
+    user_context: dict[str, str],
+    tmp_path: Path,
+    f_clean_up_event_log: None,  # noqa: ARG001
+) -> None:
+    ids = create_events(user_context, 3)
+    checkpoint = ReplayCheckpoint(tmp_path / 'replay.json', ReplayFilter(), chunk_size=2)
+    checkpoint.replay_range = resolve_replay_range(ReplayFilter())
+    checkpoint.add(ReplayChunk(first_id=ids[2], last_id=ids[2]))
+    create_events(user_context, 1)
+
+    stdout = StringIO()
+    call_command('replay_event_log', chunk_size=2, workers=0, checkpoint=tmp_path / 'replay.json', stdout=stdout)
+
+    # The event created since is outside the range of the interrupted replay
+    assert 'Replaying 1 of 2 chunks' in stdout.getvalue()
+    assert f'ids {ids[0]}-{ids[1]}: 2 events' in stdout.getvalue()
+    resumed = ReplayCheckpoint(tmp_path / 'replay.json', ReplayFilter(), chunk_size=2)
+    resumed.load()
+    assert resumed.replay_range == ReplayChunk(first_id=ids[0], last_id=ids[2])
+    assert resumed.done == {(ids[0], ids[1]), (ids[2], ids[2])}
+
+
+@pytest.mark.django_db
+def test_selected_events_are_replayed(
+    user_context: dict[str, str],
+    f_ch_client: Client,
+    f_clean_up_event_log: None,  # noqa: ARG001
+) -> None:
+    create_events(user_context, 3)
+    create_events(user_context, 2, event_type=EventType.USER_UPDATED)
+
+    call_command(
+        'replay_event_log',
+        event_types=[EventType.USER_CREATED],
+        chunk_size=2,
+        workers=0,
+        stdout=StringIO(),
+    )
+
+    log = f_ch_client.query('SELECT event_type FROM default.event_log')
+    assert [row[0] for row in log.result_rows] == ['user_created'] * 3
+
+
+@pytest.mark.django_db
+def test_replayed_events_keep_their_time(
+    user_context: dict[str, str],
+    f_ch_client: Client,
+    f_clean_up_event_log: None,  # noqa: ARG001
+) -> None:
+    created_at = dt.datetime(2024, 1, 15, 12, 30, 45, 123456, tzinfo=dt.UTC)
+    EventOutbox.objects.filter(id__in=create_events(user_context, 1)).update(event_date_time=created_at)
+
+    call_command('replay_event_log', workers=0, stdout=StringIO())
+
+    log = f_ch_client.query('SELECT event_date_time FROM default.event_log')
+    assert [row[0].replace(tzinfo=dt.UTC) for row in log.result_rows] == [created_at]
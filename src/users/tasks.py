@@ -1,33 +1,134 @@
 
 import structlog
-from celery import shared_task
+from celery import Task, shared_task
+from django.conf import settings
 from django.db import transaction
-from sentry_sdk import start_transaction
+from sentry_sdk import start_span
 
+from core.circuit_breaker import CircuitState
+from core.db import close_db_connections_after_failure
+from core.event_log_client import get_circuit_breaker
+from core.locks import LeaseSemaphore
+from core.profiling import get_batch_profiler
+from core.tracing import trace_stage
 from users.clickhouse import batch_insert_into_clickhouse
+from users.outbox import claim_outbox_events, coalesce_outbox_events, park_failed_outbox_events
 
 from .models import EventOutbox
 
 logger = structlog.get_logger(__name__)
 
+OUTBOX_DRAIN_LOCK_NAME = 'outbox:drain'
+
+
 @shared_task
-def process_event_outbox() -> None:
-    with start_transaction(op="task", name="Process Event Outbox"):
+def process_event_outbox() -> int:
+    # A span of the transaction Sentry's Celery integration starts for the task
+    with start_span(op="task", name="Process Event Outbox"):
         logger.info("Processing event outbox")
+        circuit_breaker = get_circuit_breaker()
+        # The half-open trial itself is taken by the insert, see EventLogClient.insert_columns
+        if circuit_breaker.state() == CircuitState.OPEN:
+            logger.warning("ClickHouse circuit breaker is open, not claiming events")
+            return 0
+        # Claim smaller batches for a while after ClickHouse recovers
+        batch_size = max(int(settings.OUTBOX_BATCH_SIZE * circuit_breaker.ramp_fraction()), 1)
         try:
             with transaction.atomic():
-                # Use skip_locked to avoid deadlocks
-                unprocessed_events = EventOutbox.objects.select_for_update(
-                    skip_locked=True,
-                ).filter(processed=False).values("id", "event_context", "event_type")
-
-                if not unprocessed_events.exists():
-                    logger.info("No unprocessed events")
-                    return
-                logger.info(f"Found {unprocessed_events.count()} unprocessed events")
-                batch_insert_into_clickhouse(list(unprocessed_events))
-
-                EventOutbox.objects.filter(id__in=[event['id'] for event in unprocessed_events]).update(processed=True)
-                logger.info(f"Marked {unprocessed_events.count()} events as processed")
+                return _process_batch(batch_size)
         except Exception as overall_exception:
             logger.exception(f"Transaction rolled back, error: {overall_exception}")
+            # The task doesn't fail, so the task_failure handler won't reset them
+            close_db_connections_after_failure()
+            return 0
+
+
+def _process_batch(batch_size: int) -> int:
+    with trace_stage('outbox.claim', 'Claim outbox events', batch_size=batch_size) as span:
+        unprocessed_events = claim_outbox_events(batch_size)
+        span.set_data('rows', len(unprocessed_events))
+        span.set_data('bytes', sum(event["context_size"] for event in unprocessed_events))
+
+    if not unprocessed_events:
+        logger.info("No unprocessed events")
+        return 0
+    logger.info(f"Found {len(unprocessed_events)} unprocessed events")
+
+    with get_batch_profiler().profile('process_event_outbox'):
+        with trace_stage('outbox.coalesce', 'Coalesce outbox events', rows=len(unprocessed_events)) as span:
+            events_to_ship, superseded = coalesce_outbox_events(unprocessed_events)
+            span.set_data('superseded', sum(map(len, superseded.values())))
+        inserted_ids = batch_insert_into_clickhouse(events_to_ship)
+
+        # Superseded events are only done once the event replacing them is written
+        superseded_ids = [event_id for inserted_id in inserted_ids for event_id in superseded.get(inserted_id, ())]
+        processed_ids = inserted_ids + superseded_ids
+        with trace_stage('outbox.ack', 'Mark outbox events as processed', rows=len(processed_ids)) as span:
+            EventOutbox.objects.filter(id__in=processed_ids).update(processed=True)
+            span.set_data('parked', len(park_failed_outbox_events(events_to_ship, inserted_ids)))
+    logger.info(f"Marked {len(processed_ids)} events as processed, {len(superseded_ids)} of them coalesced")
+    # Events that failed are claimed again, so they don't count towards the drain's pace
+    return len(processed_ids)
+
+
+def next_poll_delay(processed: int, previous_delay: float) -> float:
+    """
+    Drains immediately while full batches keep coming, polls at the minimum
+    delay after a partial batch and backs off exponentially while idle.
+    """
+    if processed >= settings.OUTBOX_BATCH_SIZE:
+        return 0
+    if processed:
+        return settings.OUTBOX_POLL_MIN_DELAY
+    return min(
+        max(previous_delay * settings.OUTBOX_POLL_BACKOFF_FACTOR, settings.OUTBOX_POLL_MIN_DELAY),
+        settings.OUTBOX_POLL_MAX_DELAY,
+    )
+
+
+def _hold_drain_slot(semaphore: LeaseSemaphore, lease: str | None) -> str | None:
+    if lease is not None and semaphore.renew(lease, settings.OUTBOX_DRAIN_LEASE_TIMEOUT):
+        return lease
+    return semaphore.acquire(settings.OUTBOX_DRAIN_LEASE_TIMEOUT)
+
+
+@shared_task(bind=True, ignore_result=True)
+def drain_event_outbox(self: Task, lease: str | None = None, delay: float = 0) -> None:
+    """
+    Self-rescheduling outbox drain. Each chain holds one of
+    `OUTBOX_DRAIN_CONCURRENCY` slots, including while it waits for its next
+    run, so extra starts (e.g. the beat watchdog) exit while all are taken.
+    """
+    semaphore = LeaseSemaphore(OUTBOX_DRAIN_LOCK_NAME, settings.OUTBOX_DRAIN_CONCURRENCY)
+    lease = _hold_drain_slot(semaphore, lease)
+    if lease is None:
+        logger.debug("All outbox drain slots are taken")
+        return
+
+    with semaphore.keep_alive(lease, settings.OUTBOX_DRAIN_LEASE_TIMEOUT) as lease_held:
+        processed = process_event_outbox()
+    if self.request.is_eager:
+        semaphore.release(lease)
+        return
+    if not lease_held():
+        logger.warning("Lost the outbox drain slot, stopping this drain chain")
+        return
+
+    _reschedule_drain(self, semaphore, lease, next_poll_delay(processed, delay))
+
+
+def _reschedule_drain(task: Task, semaphore: LeaseSemaphore, lease: str, delay: float) -> None:
+    # The slot stays held until the next run, which renews it again
+    if not semaphore.renew(lease, delay + settings.OUTBOX_DRAIN_LEASE_TIMEOUT):
+        logger.warning("Lost the outbox drain slot, stopping this drain chain")
+        return
+    try:
+        # Each run is sampled on its own instead of inheriting the first run's decision forever
+        task.apply_async(
+            kwargs={'lease': lease, 'delay': delay},
+            countdown=delay,
+            headers={'sentry-propagate-traces': False},
+        )
+    except Exception:
+        semaphore.release(lease)
+        raise
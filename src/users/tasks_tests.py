@@ -0,0 +1,127 @@
+import uuid
+from unittest.mock import patch
+
+import pytest
+from django.db import DatabaseError, connection, transaction
+from django.test import override_settings
+
+from core.circuit_breaker import CircuitBreaker
+from core.redis import get_redis
+from users.models import EventOutbox, EventType
+from users.outbox import claim_outbox_events
+from users.tasks import OUTBOX_DRAIN_LOCK_NAME, drain_event_outbox, next_poll_delay, process_event_outbox
+
+
+@override_settings(OUTBOX_BATCH_SIZE=100, OUTBOX_POLL_MIN_DELAY=0.5, OUTBOX_POLL_MAX_DELAY=8)
+@pytest.mark.parametrize(
+    ('processed', 'previous_delay', 'expected'),
+    [
+        (100, 4, 0),
+        (10, 4, 0.5),
+        (0, 0, 0.5),
+        (0, 0.5, 1),
+        (0, 4, 8),
+        (0, 8, 8),
+    ],
+)
+def test_next_poll_delay(processed: int, previous_delay: float, expected: float) -> None:
+    assert next_poll_delay(processed, previous_delay) == expected
+
+
+@pytest.mark.django_db(transaction=True)
+def test_connections_are_closed_after_failed_batch() -> None:
+    connection.ensure_connection()
+
+    with patch('users.tasks.claim_outbox_events', side_effect=DatabaseError('connection lost')):
+        assert process_event_outbox() == 0
+
+    assert connection.connection is None
+
+
+@pytest.mark.django_db
+def test_open_breaker_skips_claiming() -> None:
+    breaker = CircuitBreaker(f'test:{uuid.uuid4()}', failure_threshold=1, reset_timeout=30, ramp_seconds=0)
+    breaker.record_failure()
+
+    with patch('users.tasks.get_circuit_breaker', return_value=breaker), patch(
+        'users.tasks.claim_outbox_events',
+    ) as claim:
+        assert process_event_outbox() == 0
+
+    claim.assert_not_called()
+
+
+@override_settings(OUTBOX_DRAIN_CONCURRENCY=1)
+def test_drain_stops_after_losing_its_slot() -> None:
+    def lose_slot() -> int:
+        get_redis().delete(f'{OUTBOX_DRAIN_LOCK_NAME}:0')
+        return 0
+
+    with patch('users.tasks.process_event_outbox', side_effect=lose_slot), patch.object(
+        drain_event_outbox, 'apply_async',
+    ) as apply_async:
+        drain_event_outbox()
+
+    apply_async.assert_not_called()
+
+
+@override_settings(OUTBOX_DRAIN_CONCURRENCY=1)
+def test_rescheduled_drain_does_not_continue_the_trace() -> None:
+    with patch('users.tasks.process_event_outbox', return_value=0), patch.object(
+        drain_event_outbox, 'apply_async',
+    ) as apply_async:
+        drain_event_outbox()
+    get_redis().delete(f'{OUTBOX_DRAIN_LOCK_NAME}:0')
+
+    assert apply_async.call_args.kwargs['headers'] == {'sentry-propagate-traces': False}
+
+
+def create_event(
+    partition_key: str,
+    event_context: dict[str, str] | None = None,
+    event_type: EventType = EventType.USER_CREATED,
+) -> EventOutbox:
+    # An empty context can't be prepared
+    return EventOutbox.objects.create(
+        event_type=event_type,
+        environment='test',
+        event_context=event_context or {},
+        metadata_version=1,
+        partition_key=partition_key,
+    )
+
+
+@pytest.mark.django_db
+def test_events_that_fail_are_not_counted_as_processed() -> None:
+    create_event('user:1')
+
+    assert process_event_outbox() == 0
+
+
+@pytest.mark.django_db
+@override_settings(OUTBOX_PARTITIONS_PER_BATCH=2, OUTBOX_DRAIN_CONCURRENCY=1)
+def test_failing_partitions_are_parked(user_context: dict[str, str]) -> None:
+    failed = [create_event('user:1'), create_event('user:1', user_context), create_event('user:2')]
+    create_event('user:3')
+    create_event('user:4', user_context)
+
+    process_event_outbox()
+
+    failed[0].refresh_from_db()
+    assert failed[0].attempts == 1
+    assert failed[0].next_attempt_at is not None
+    # Held back behind the failed event, not failed itself
+    assert EventOutbox.objects.get(id=failed[1].id).attempts == 0
+    with transaction.atomic():
+        claimed = claim_outbox_events(batch_size=10)
+    assert {event['partition_key'] for event in claimed} == {'user:3', 'user:4'}
+
+
+@pytest.mark.django_db
+def test_superseded_update_waits_for_the_latest_to_be_written(user_context: dict[str, str]) -> None:
+    superseded = create_event('user:1', user_context, EventType.USER_UPDATED)
+    latest = create_event('user:1', event_type=EventType.USER_UPDATED)
+
+    assert process_event_outbox() == 0
+
+    assert not EventOutbox.objects.filter(id__in=[superseded.id, latest.id], processed=True).exists()
@@ -1,3 +1,13 @@
 from .create_user import CreateUser, CreateUserRequest, CreateUserResponse, UserCreated
+from .update_user import UpdateUser, UpdateUserRequest, UpdateUserResponse, UserUpdated
 
-__all__ = ['CreateUser', 'CreateUserRequest', 'CreateUserResponse', 'UserCreated']
+__all__ = [
+    'CreateUser',
+    'CreateUserRequest',
+    'CreateUserResponse',
+    'UpdateUser',
+    'UpdateUserRequest',
+    'UpdateUserResponse',
+    'UserCreated',
+    'UserUpdated',
+]
@@ -70,5 +70,6 @@ class CreateUser(UseCase):
                 'last_name': user.last_name,
             },
             metadata_version=1,  # Adjust if your logic requires different versioning
+            partition_key=f'user:{user.pk}',
         )
 
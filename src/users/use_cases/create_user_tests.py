@@ -148,7 +148,45 @@ def test_batch_insert_into_clickhouse(user_context: dict[str, str]) -> None:
         result = client.query(query)
 
 
-    assert json.loads(result[0][0]) == user_context
+    assert json.loads(result.rows[0][0]) == user_context
+
+def test_metadata_version_is_taken_from_outbox(
+    user_context: dict[str, str],
+    f_ch_client: Client,
+) -> None:
+    _ = EventOutbox.objects.create(
+        event_type=EventType.USER_CREATED,
+        environment='test',
+        event_context=user_context,
+        metadata_version=3,
+        processed=False,
+    )
+
+    process_event_outbox()
+    log = f_ch_client.query(f'SELECT metadata_version FROM {settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME}')  # noqa: S608
+
+    assert log.result_rows == [(3,)]
+
+
+def test_email_is_materialized(
+    user_context: dict[str, str],
+    f_ch_client: Client,
+) -> None:
+    _ = EventOutbox.objects.create(
+        event_type=EventType.USER_CREATED,
+        environment='test',
+        event_context=user_context,
+        metadata_version=1,
+        processed=False,
+    )
+
+    process_event_outbox()
+    log = f_ch_client.query(
+        f'SELECT email FROM {settings.CLICKHOUSE_EVENT_LOG_TABLE_NAME} WHERE email = %(email)s',  # noqa: S608
+        parameters={'email': user_context['email']},
+    )
+
+    assert log.result_rows == [(user_context['email'],)]
 
 def test_prepare_clickhouse_record(user_context: dict[str, str], event: dict[str, Any]) -> None:
     result = prepare_clickhouse_record(event)
@@ -0,0 +1,66 @@
+from typing import Any
+
+import structlog
+from django.conf import settings
+from django.db import transaction
+
+from core.base_model import Model
+from core.use_case import UseCase, UseCaseRequest, UseCaseResponse
+from users.models import EventOutbox, EventType, User
+
+logger = structlog.get_logger(__name__)
+
+
+class UserUpdated(Model):
+    email: str
+    first_name: str
+    last_name: str
+
+
+class UpdateUserRequest(UseCaseRequest):
+    email: str
+    first_name: str = ''
+    last_name: str = ''
+
+
+class UpdateUserResponse(UseCaseResponse):
+    result: User | None = None
+    error: str = ''
+
+
+class UpdateUser(UseCase):
+    def _get_context_vars(self, request: UseCaseRequest) -> dict[str, Any]:
+        return {
+            'email': request.email,
+            'first_name': request.first_name,
+            'last_name': request.last_name,
+        }
+
+    def _execute(self, request: UpdateUserRequest) -> UpdateUserResponse:
+        logger.info('updating a user')
+
+        with transaction.atomic():
+            user = User.objects.select_for_update().filter(email=request.email).first()
+            if user is None:
+                logger.error('unable to find the user')
+                return UpdateUserResponse(error='User with this email does not exist')
+
+            user.first_name = request.first_name
+            user.last_name = request.last_name
+            user.save(update_fields=['first_name', 'last_name'])
+            logger.info('user has been updated')
+            self._log_user_updated(user, settings.ENVIRONMENT)
+            return UpdateUserResponse(result=user)
+
+    def _log_user_updated(self, user: User, environment: str) -> None:
+        _ = EventOutbox.objects.create(
+            event_type=EventType.USER_UPDATED,
+            environment=environment,
+            event_context={
+                'email': user.email,
+                'first_name': user.first_name,
+                'last_name': user.last_name,
+            },
+            metadata_version=1,
+            partition_key=f'user:{user.pk}',
+        )